@@ -0,0 +1,368 @@
+import json
+import logging
+import mmap
+import os
+import sys
+import tempfile
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import chain, compress
+
+from data_types import Attendance, TeachersAttendancesStats
+from loaders import get_period_days
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка файла недоступна, файлом пользуется один процесс
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class AttendanceStore:
+    """Колоночное хранилище посещений.
+
+    Каждая строка - ученик на занятии (занятие без учеников дает одну строку без ученика). Столбцы
+    хранятся в массивах array, преподаватели, ученики и статусы - кодами в словарях. Занятия одного
+    дня одного вида (групповые или индивидуальные) занимают непрерывный диапазон строк, поэтому
+    выборка за период - это срезы столбцов, а статистика считается подсчетом по срезам без
+    перебора вложенных словарей.
+
+    Занятия за дни старше `immutable_after_days` сохраняются в файл, который при следующем запуске
+    отображается в память (mmap) без разбора: эти дни повторно не загружаются из Paraplan.
+    Файл записывается во временный файл рядом и заменяется под блокировкой `<path>.lock`, поэтому
+    процессы, которые сохраняют хранилище одновременно, не портят файл друг друга.
+    """
+
+    COLUMNS = {
+        "day": "i",  # date.toordinal()
+        "minute": "h",  # минута от начала суток, -1 - время неизвестно
+        "lesson": "i",  # номер занятия в хранилище
+        "teachers": "i",
+        "student": "i",  # -1 - занятие без учеников
+        "status": "h",  # -1 - статус неизвестен
+    }
+    KINDS = ("group", "individual")
+    FILE_MAGIC = b"PARAPLAN-ATTENDANCES\n"
+
+    def __init__(self, path: str | None = None, immutable_after_days: int = 7, refresh: bool = False):
+        self.path = path
+        self.immutable_after_days = immutable_after_days
+
+        self._lock = threading.Lock()
+        self._columns = {name: array(typecode) for name, typecode in self.COLUMNS.items()}
+        self._teachers, self._teacher_codes = [], dict()
+        self._students, self._student_codes = [], dict()
+        self._statuses, self._status_codes = [], dict()
+        # (вид, день) -> (первая строка, строка после последней)
+        self._partitions = dict()
+        self._lessons_count = 0
+        # Неизменяемые дни, которые уже есть в файле
+        self._saved_partitions = set()
+        self._mapped = None
+
+        if path and not refresh and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self):
+        return len(self._columns["day"])
+
+    @staticmethod
+    def _encode(values: list, codes: dict, key, value=None) -> int:
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(values)
+            values.append(key if value is None else value)
+        return code
+
+    def _is_immutable(self, day: date) -> bool:
+        return day < date.today() - timedelta(days=self.immutable_after_days)
+
+    def missing_days(self, kind: str, period: tuple[date, date]) -> list:
+        """Дни периода, занятий которых еще нет в хранилище"""
+        return [day for day in get_period_days(period) if (kind, day) not in self._partitions]
+
+    def append(self, kind: str, day: date, attendances: list[Attendance]) -> None:
+        """Добавляет занятия одного дня одного вида"""
+        with self._lock:
+            self._materialize()
+            columns = self._columns
+            start = len(self)
+            for attendance in attendances:
+                lesson = self._lessons_count
+                self._lessons_count += 1
+                minute = -1
+                if attendance.hour is not None and attendance.minute is not None:
+                    minute = attendance.hour * 60 + attendance.minute
+                teachers = self._encode(self._teachers, self._teacher_codes, attendance.teachers)
+
+                for attendee in attendance.attendees or (None,):
+                    student, status = -1, -1
+                    if attendee and attendee.student_id:
+                        student = self._encode(self._students, self._student_codes, attendee.student_id,
+                                               (attendee.student_id, attendee.student_name))
+                    if attendee and attendee.status_id:
+                        status = self._encode(self._statuses, self._status_codes, attendee.status_id)
+
+                    columns["day"].append(day.toordinal())
+                    columns["minute"].append(minute)
+                    columns["lesson"].append(lesson)
+                    columns["teachers"].append(teachers)
+                    columns["student"].append(student)
+                    columns["status"].append(status)
+
+            self._partitions[(kind, day)] = (start, len(self))
+
+    def _get_ranges(self, period: tuple[date, date], kinds: tuple) -> list:
+        """Диапазоны строк периода по порядку дней, соседние диапазоны объединяются"""
+        ranges = []
+        for day in get_period_days(period):
+            for kind in kinds:
+                start, end = self._partitions.get((kind, day), (0, 0))
+                if start == end:
+                    continue
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1] = (ranges[-1][0], end)
+                else:
+                    ranges.append((start, end))
+        return ranges
+
+    def _take(self, name: str, ranges: list) -> list:
+        column = self._columns[name]
+        if len(ranges) == 1:
+            return column[ranges[0][0]:ranges[0][1]].tolist()
+        return list(chain.from_iterable(column[start:end] for start, end in ranges))
+
+    def _get_status_codes(self, statuses: tuple) -> set:
+        return {self._status_codes[status] for status in statuses if status in self._status_codes}
+
+    def get_teachers_stats(self, period: tuple[date, date], kind: str) -> TeachersAttendancesStats:
+        """Статистика посещений по первому преподавателю занятия, как в TeachersAttendancesStats"""
+        with self._lock:
+            ranges = self._get_ranges(period, (kind,))
+            teacher_codes = self._take("teachers", ranges)
+            status_codes = self._take("status", ranges)
+            lessons = self._take("lesson", ranges)
+            first_teachers = [teachers[0] if teachers else None for teachers in self._teachers]
+            statuses = list(self._statuses)
+
+        slots = TeachersAttendancesStats.STATUS_SLOTS
+        counting_codes = {code for code, status in enumerate(statuses)
+                          if status in slots and TeachersAttendancesStats.COUNTING_SLOTS[slots[status]]}
+        # Занятие засчитывается, если хотя бы один ученик пришел: {занятие: преподаватели} без повторов
+        counted_lessons = dict(compress(zip(lessons, teacher_codes), map(counting_codes.__contains__, status_codes)))
+
+        # Преподаватели идут в порядке первого появления, как при переборе занятий по порядку:
+        # {преподаватель: [{статус: учеников}, проведенных занятий]}
+        teachers = dict()
+        for teacher_code in dict.fromkeys(teacher_codes):
+            if first_teachers[teacher_code] is not None:
+                teachers.setdefault(first_teachers[teacher_code], [Counter(), 0])
+        for (teacher_code, status_code), count in Counter(zip(teacher_codes, status_codes)).items():
+            if status_code >= 0 and first_teachers[teacher_code] is not None:
+                teachers[first_teachers[teacher_code]][0][statuses[status_code]] += count
+        for teacher_code, count in Counter(counted_lessons.values()).items():
+            if first_teachers[teacher_code] is not None:
+                teachers[first_teachers[teacher_code]][1] += count
+
+        stats = TeachersAttendancesStats()
+        for teacher, (teacher_statuses, attendances_count) in teachers.items():
+            stats.add_counts(teacher, teacher_statuses, attendances_count)
+        return stats
+
+    @staticmethod
+    def _format_minute(minute: int) -> str:
+        if minute < 0:
+            return "-"
+        return f"{minute // 60}:{str(minute % 60).zfill(2)}"
+
+    def get_attendees(self, period: tuple[date, date], statuses: tuple) -> list:
+        """Ученики со статусом из statuses: [(дата, время занятия, id ученика, имя ученика, преподаватели), ...]
+
+        Порядок - по дням, в пределах дня сначала групповые, затем индивидуальные занятия.
+        """
+        with self._lock:
+            ranges = self._get_ranges(period, self.KINDS)
+            selected = list(map(self._get_status_codes(statuses).__contains__, self._take("status", ranges)))
+            rows = zip(*(compress(self._take(name, ranges), selected)
+                         for name in ("day", "minute", "student", "teachers")))
+            return [
+                (date.fromordinal(day), self._format_minute(minute), *self._students[student], self._teachers[teachers])
+                for day, minute, student, teachers in rows if student >= 0
+            ]
+
+    def get_student_ids(self, period: tuple[date, date]) -> set:
+        """id учеников, записанных на занятия периода"""
+        with self._lock:
+            return {self._students[student][0]
+                    for student in set(self._take("student", self._get_ranges(period, self.KINDS))) if student >= 0}
+
+    def get_weekday_load(self, period: tuple[date, date]) -> list:
+        """Загрузка по дням недели: [{"weekday": 0 (пн)...6 (вс), "lessons": занятий, "attendees": учеников}, ...]"""
+        with self._lock:
+            ranges = self._get_ranges(period, self.KINDS)
+            weekdays = [(day - 1) % 7 for day in self._take("day", ranges)]
+            lessons = self._take("lesson", ranges)
+            students = self._take("student", ranges)
+
+        lessons_count = Counter(weekday for weekday, _ in set(zip(weekdays, lessons)))
+        attendees_count = Counter(compress(weekdays, (student >= 0 for student in students)))
+        return [{"weekday": weekday, "lessons": lessons_count[weekday], "attendees": attendees_count[weekday]}
+                for weekday in range(7)]
+
+    def clear(self, since: date | None = None) -> None:
+        """Забывает занятия: все или только за дни начиная с since"""
+        with self._lock:
+            kept = {key: rows for key, rows in self._partitions.items() if since is not None and key[1] < since}
+            self._repack(kept)
+
+    def _repack(self, partitions: dict) -> None:
+        """Оставляет в столбцах только строки partitions"""
+        ranges = list(partitions.values())
+        columns = {name: array(typecode, self._take(name, ranges)) for name, typecode in self.COLUMNS.items()}
+        self._close_mapped()
+        self._columns = columns
+
+        self._partitions, start = dict(), 0
+        for key, (first_row, end_row) in partitions.items():
+            self._partitions[key] = (start, start + end_row - first_row)
+            start += end_row - first_row
+
+    def _materialize(self) -> None:
+        """Копирует столбцы, отображенные из файла, в массивы, чтобы в них можно было добавлять строки"""
+        if self._mapped:
+            self._columns = {name: array(self.COLUMNS[name], column) for name, column in self._columns.items()}
+            self._close_mapped()
+
+    def _close_mapped(self) -> None:
+        if not self._mapped:
+            return
+        mapped, views = self._mapped
+        for view in views:
+            view.release()
+        mapped.close()
+        self._mapped = None
+
+    def _get_data_start(self, header_length: int) -> int:
+        data_start = len(self.FILE_MAGIC) + 8 + header_length
+        return data_start + -data_start % 8
+
+    def _load(self, path: str) -> None:
+        try:
+            with open(path, "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as err:
+            logger.warning(f"Attendance store {path} can't be opened, ignoring it: {err}")
+            return
+
+        try:
+            header_start = len(self.FILE_MAGIC) + 8
+            if mapped[:len(self.FILE_MAGIC)] != self.FILE_MAGIC:
+                raise ValueError("unknown file format")
+            header_length = int.from_bytes(mapped[len(self.FILE_MAGIC):header_start], "little")
+            header = json.loads(mapped[header_start:header_start + header_length])
+            if header["byteorder"] != sys.byteorder or header["columns"].keys() != self.COLUMNS.keys():
+                raise ValueError("incompatible byte order or columns")
+
+            data_start = self._get_data_start(header_length)
+            base_view = memoryview(mapped)
+            views = [base_view]
+            for name, (offset, size) in header["columns"].items():
+                views.append(base_view[data_start + offset:data_start + offset + size].cast(self.COLUMNS[name]))
+                self._columns[name] = views[-1]
+        except (ValueError, KeyError, TypeError) as err:
+            logger.warning(f"Attendance store {path} is corrupted, ignoring it: {err}")
+            mapped.close()
+            return
+
+        self._mapped = (mapped, views)
+        self._teachers = [tuple(teachers) for teachers in header["teachers"]]
+        self._teacher_codes = {teachers: code for code, teachers in enumerate(self._teachers)}
+        self._students = [tuple(student) for student in header["students"]]
+        self._student_codes = {student[0]: code for code, student in enumerate(self._students)}
+        self._statuses = header["statuses"]
+        self._status_codes = {status: code for code, status in enumerate(self._statuses)}
+        self._partitions = {(kind, date.fromordinal(day)): (start, end)
+                            for kind, day, start, end in header["partitions"]}
+        self._lessons_count = header["lessons_count"]
+        self._saved_partitions = set(self._partitions)
+        logger.info(f"Attendance store loaded: {len(self)} rows, {len(self._partitions)} day partitions")
+
+    @contextmanager
+    def _file_lock(self):
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        """Сохраняет в файл занятия за неизменяемые дни, если набор этих дней изменился
+
+        Набор меняется не только при добавлении старых дней: в режиме демона загруженные дни
+        со временем становятся старше горизонта и тоже должны попасть в файл.
+        """
+        if not self.path:
+            return
+
+        with self._lock:
+            partitions = {key: rows for key, rows in self._partitions.items() if self._is_immutable(key[1])}
+            if partitions.keys() == self._saved_partitions:
+                return
+            ranges = list(partitions.values())
+            columns = {name: array(typecode, self._take(name, ranges)) for name, typecode in self.COLUMNS.items()}
+
+            # Смещения столбцов отсчитываются от начала данных, которые идут после заголовка с выравниванием на 8
+            header = {
+                "byteorder": sys.byteorder,
+                "columns": dict(),
+                "teachers": self._teachers,
+                "students": self._students,
+                "statuses": self._statuses,
+                "partitions": [],
+                "lessons_count": self._lessons_count,
+            }
+            start = 0
+            for (kind, day), (first_row, end_row) in partitions.items():
+                header["partitions"].append([kind, day.toordinal(), start, start + end_row - first_row])
+                start += end_row - first_row
+
+            offset = 0
+            for name, column in columns.items():
+                offset += -offset % 8
+                header["columns"][name] = [offset, len(column) * column.itemsize]
+                offset += len(column) * column.itemsize
+            header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+            data_start = self._get_data_start(len(header_bytes))
+
+            directory, filename = os.path.split(os.path.abspath(self.path))
+            with self._file_lock():
+                file_descriptor, temporary_path = tempfile.mkstemp(prefix=f"{filename}.", suffix=".tmp", dir=directory)
+                try:
+                    with os.fdopen(file_descriptor, "wb") as file:
+                        file.write(self.FILE_MAGIC)
+                        file.write(len(header_bytes).to_bytes(8, "little"))
+                        file.write(header_bytes)
+                        for name, column in columns.items():
+                            file.seek(data_start + header["columns"][name][0])
+                            column.tofile(file)
+
+                    # Файл может быть отображен в память, поэтому перед заменой столбцы копируются в массивы
+                    self._materialize()
+                    os.replace(temporary_path, self.path)
+                except BaseException:
+                    os.remove(temporary_path)
+                    raise
+            self._saved_partitions = set(partitions)
+
+        logger.info(f"Attendance store saved: {len(columns['day'])} rows, {len(partitions)} day partitions")
+
+    def close(self) -> None:
+        with self._lock:
+            self._materialize()
@@ -0,0 +1,70 @@
+"""Бенчмарк накопителя TeachersAttendancesStats на синтетических посещениях.
+
+Запуск из корня проекта:
+
+    python benchmarks/bench_teachers_stats.py --attendances 200000 --parts 8
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_types import StatusesEnum, TeachersAttendancesStats  # noqa: E402
+from decoding import parse_attendance  # noqa: E402
+
+
+def generate_attendances(count: int, teachers: int, attendees: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    statuses = [status.value for status in StatusesEnum] + ["unknown-status"]
+    return [
+        parse_attendance({
+            "teacherList": [{"teacherInfo": {"name": f"Teacher {rnd.randrange(teachers)}"}}] if rnd.random() > 0.05
+            else [],
+            "attendeeList": [{"statusId": rnd.choice(statuses)} for _ in range(rnd.randint(1, attendees))]
+        })
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attendances", type=int, default=100_000)
+    parser.add_argument("--teachers", type=int, default=50)
+    parser.add_argument("--attendees", type=int, default=12, help="максимум учеников на занятии")
+    parser.add_argument("--parts", type=int, default=8, help="на сколько частей делить список для merge()")
+    args = parser.parse_args()
+
+    attendances = generate_attendances(args.attendances, args.teachers, args.attendees)
+
+    started_at = time.perf_counter()
+    stats = TeachersAttendancesStats()
+    for attendance in attendances:
+        stats.add_teacher_attendance_stats(attendance)
+    add_time = time.perf_counter() - started_at
+
+    part_size = -(-len(attendances) // args.parts)
+    partial_stats = []
+    for part_start in range(0, len(attendances), part_size):
+        part = TeachersAttendancesStats()
+        for attendance in attendances[part_start:part_start + part_size]:
+            part.add_teacher_attendance_stats(attendance)
+        partial_stats.append(part)
+
+    started_at = time.perf_counter()
+    merged = TeachersAttendancesStats()
+    for part in partial_stats:
+        merged = merged.merge(part)
+    merge_time = time.perf_counter() - started_at
+
+    assert merged.get_stats() == stats.get_stats(), "merge() дает результат, отличный от последовательного"
+
+    print(f"add:   {len(attendances)} attendances in {add_time:.3f}s "
+          f"({len(attendances) / add_time:,.0f} attendances/s)")
+    print(f"merge: {len(partial_stats)} parts in {merge_time * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
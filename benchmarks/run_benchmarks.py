@@ -0,0 +1,83 @@
+"""Сквозной бенчмарк отчетов на локальной замене Paraplan.
+
+Для каждого действия CLI отчет строится на синтетической компании в последовательном
+и параллельном режимах. Выводятся время, количество запросов и пиковая память.
+
+    python benchmarks/run_benchmarks.py --students 1000 --days 60 --latency 0.02 --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stand_in import StandInServer, SyntheticCompany  # noqa: E402
+
+
+def run_report(main_module, server: StandInServer, action: str, workers: int, output_dir: str) -> dict:
+    server.reset_stats()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+
+    paraplan = main_module.ParaplanAPI(max_workers=workers)
+    report = main_module.REPORTS[action]
+    report["create"](paraplan, os.path.join(output_dir, f"{workers}-{report['filename']}"))
+
+    wall_time = time.perf_counter() - started_at
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "action": action,
+        "workers": workers,
+        "wall_time": round(wall_time, 3),
+        "requests": sum(server.requests_count.values()),
+        "requests_by_endpoint": dict(server.requests_count),
+        "bytes_received": server.bytes_sent,
+        "peak_memory_mb": round(peak_memory / 1024 / 1024, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.01, help="задержка ответа сервера в секундах")
+    parser.add_argument("--workers", type=int, default=8, help="количество потоков для параллельного режима")
+    parser.add_argument("--actions", help="действия через запятую (по умолчанию все)")
+    parser.add_argument("--json", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args()
+
+    server = StandInServer(("127.0.0.1", 0), company=SyntheticCompany(args.students, args.groups, args.days),
+                           latency=args.latency)
+    server.start()
+
+    # Адрес Paraplan читается при импорте main
+    os.environ["PARAPLAN_BASE_URL"] = server.base_url
+    import main as main_module
+
+    actions = args.actions.split(",") if args.actions else list(main_module.REPORTS)
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for action in actions:
+            for workers in sorted({1, args.workers}):
+                result = run_report(main_module, server, action, workers, output_dir)
+                results.append(result)
+                print(f"{action:<36} workers={workers:<3} {result['wall_time']:>8.2f}s "
+                      f"{result['requests']:>7} requests {result['peak_memory_mb']:>8.2f} MB")
+
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
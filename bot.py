@@ -1,27 +1,36 @@
 import os
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 import telebot
 from dotenv import load_dotenv
 
+from exceptions import BotConfigError
+from log_config import setup_logging
+
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, filename="logs.log",
-                    format="%(asctime)s::%(levelname)s::%(message)s")
+setup_logging()
 
 load_dotenv()
 
-if not os.getenv("BOT_TOKEN", None):
-    print("Токен бота не указан")
-    logger.error("Токен бота не указан")
-    exit()
-if not os.getenv("USER_IDS", None):
-    print("Не указаны id пользователей")
-    logger.error("Не указаны id пользователей")
-    exit()
+SEND_ATTEMPTS = 3
+SEND_MAX_WORKERS = 8
+
 
+def get_bot_config() -> tuple[str, list]:
+    """Токен бота и id пользователей из BOT_TOKEN и USER_IDS
 
-USER_IDS = os.getenv("USER_IDS").split(",")
-BOT_TOKEN = os.getenv("BOT_TOKEN")
+    Проверяется при отправке, а не при импорте: режимы, которые ничего не отправляют в Telegram
+    (serve, tenants.py без --send), работают без этих переменных.
+    """
+    if not os.getenv("BOT_TOKEN", None):
+        raise BotConfigError("Токен бота не указан")
+    if not os.getenv("USER_IDS", None):
+        raise BotConfigError("Не указаны id пользователей")
+    return os.getenv("BOT_TOKEN"), os.getenv("USER_IDS").split(",")
 
 
 def remove_report_file(filename: str) -> None:
@@ -33,17 +42,70 @@ def remove_report_file(filename: str) -> None:
         logger.error(err)
 
 
-def send_report_to_tg(filename: str) -> None:
-    bot = telebot.TeleBot(token=BOT_TOKEN)
+def _is_transient_error(err: Exception) -> bool:
+    if isinstance(err, telebot.apihelper.ApiTelegramException):
+        return err.error_code == 429 or err.error_code >= 500
+    return isinstance(err, (requests.ConnectionError, requests.Timeout))
 
-    document = open(filename, 'rb')
 
-    for user_id in USER_IDS:
+def _send_document_with_retry(bot: telebot.TeleBot, user_id: str, document,
+                              visible_file_name: str | None = None) -> telebot.types.Message:
+    """Отправляет документ (файл или file_id), повторяя попытку при временных ошибках (429, 5xx, сетевые ошибки)"""
+    for attempt in range(1, SEND_ATTEMPTS + 1):
         try:
-            bot.send_document(user_id, document)
+            if hasattr(document, "seek"):
+                document.seek(0)
+            return bot.send_document(user_id, document, visible_file_name=visible_file_name)
+        except Exception as err:
+            if attempt == SEND_ATTEMPTS or not _is_transient_error(err):
+                raise
+
+            retry_after = 2 ** attempt
+            if isinstance(err, telebot.apihelper.ApiTelegramException):
+                retry_after = (err.result_json or {}).get("parameters", {}).get("retry_after", retry_after)
+            logger.warning(f"Sending to user {user_id} failed ({err}), retrying in {retry_after}s")
+            time.sleep(retry_after)
+
+
+def send_report_to_tg(filename: str) -> dict:
+    """Отправляет отчет всем пользователям из USER_IDS и удаляет файл
+
+    Файл загружается в Telegram один раз, остальным пользователям параллельно отправляется
+    file_id уже загруженного документа. Возвращает результат по каждому пользователю:
+    {id пользователя: None, если отчет доставлен, иначе текст ошибки}.
+    """
+    bot_token, user_ids = get_bot_config()
+    bot = telebot.TeleBot(token=bot_token)
+    results = dict()
+
+    # Загружаем файл первому пользователю, которому удалось отправить; если не удалось - следующему
+    file_id = None
+    pending_user_ids = list(user_ids)
+    with open(filename, "rb") as document:
+        while pending_user_ids and file_id is None:
+            user_id = pending_user_ids.pop(0)
+            try:
+                message = _send_document_with_retry(bot, user_id, document, os.path.basename(filename))
+                file_id = message.document.file_id
+                results[user_id] = None
+            except Exception as err:
+                results[user_id] = str(err)
+
+    if file_id and pending_user_ids:
+        with ThreadPoolExecutor(max_workers=min(len(pending_user_ids), SEND_MAX_WORKERS)) as executor:
+            futures = {user_id: executor.submit(_send_document_with_retry, bot, user_id, file_id)
+                       for user_id in pending_user_ids}
+        for user_id, future in futures.items():
+            error = future.exception()
+            results[user_id] = str(error) if error else None
+
+    results = {user_id: results[user_id] for user_id in user_ids}
+    for user_id, error in results.items():
+        if error:
+            print(f"Не получилось отправить файл пользователю {user_id}", error)
+            logger.error(f"File {filename} was not sent to user {user_id}: {error}")
+        else:
             logger.info(f"File {filename} sent to user {user_id}")
-        except telebot.apihelper.ApiTelegramException as err:
-            print("Не получилось отправить файл", err)
-            logger.error(err)
 
     remove_report_file(filename)
+    return results
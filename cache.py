@@ -0,0 +1,138 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Дисковый кэш ответов API на SQLite.
+
+    Ключ записи - эндпоинт и полный URL запроса (вместе с параметрами). Для каждого эндпоинта
+    задается свое время жизни записи; ответы за дни старше `immutable_after_days` считаются
+    неизменяемыми и не устаревают. При превышении `max_size_bytes` удаляются устаревшие записи,
+    а затем записи, к которым дольше всего не обращались, пока размер не опустится до `evict_to_ratio`
+    от предела: так удаление выполняется пачками, а не при каждой записи.
+
+    Общий размер ответов хранится в памяти и обновляется при записи. Время обращения при чтении
+    из кэша записывается в базу пачками по ACCESS_BATCH_SIZE - вместе со следующей записью ответа.
+    """
+
+    DEFAULT_TTLS = {
+        "group_attendances": 60 * 60,
+        "individual_attendances": 60 * 60,
+        "attendance_for_screen": 60 * 60,
+        "group_info": 6 * 60 * 60,
+    }
+    ACCESS_BATCH_SIZE = 256
+
+    def __init__(self, path: str = "cache.sqlite3", ttls: dict | None = None, immutable_after_days: int = 7,
+                 max_size_bytes: int = 200 * 1024 * 1024, refresh: bool = False, evict_to_ratio: float = 0.9):
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.immutable_after_days = immutable_after_days
+        self.max_size_bytes = max_size_bytes
+        self.refresh = refresh
+        self.evict_to_ratio = evict_to_ratio
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._accessed = dict()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "endpoint TEXT NOT NULL, url TEXT NOT NULL, body TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, last_access REAL NOT NULL, PRIMARY KEY (endpoint, url))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+        self._connection.commit()
+        self._total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _is_immutable(self, day: date | None) -> bool:
+        return day is not None and day < date.today() - timedelta(days=self.immutable_after_days)
+
+    def is_cacheable(self, endpoint: str) -> bool:
+        return self.ttls.get(endpoint, 0) > 0
+
+    def get(self, endpoint: str, url: str) -> str | None:
+        if self.refresh or not self.is_cacheable(endpoint):
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, expires_at FROM responses WHERE endpoint = ? AND url = ?", (endpoint, url)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                return None
+
+            self._accessed[(endpoint, url)] = now
+            if len(self._accessed) >= self.ACCESS_BATCH_SIZE:
+                self._flush_accessed()
+                self._connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, endpoint: str, url: str, body: str, day: date | None = None) -> None:
+        if not self.is_cacheable(endpoint):
+            return
+
+        now = time.time()
+        expires_at = None if self._is_immutable(day) else now + self.ttls[endpoint]
+        with self._lock:
+            previous = self._connection.execute(
+                "SELECT size FROM responses WHERE endpoint = ? AND url = ?", (endpoint, url)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (endpoint, url, body, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (endpoint, url, body, len(body), expires_at, now)
+            )
+            self._accessed.pop((endpoint, url), None)
+            self._total_size += len(body) - (previous[0] if previous else 0)
+
+            self._flush_accessed()
+            if self._total_size > self.max_size_bytes:
+                self._evict()
+            self._connection.commit()
+
+    def _flush_accessed(self) -> None:
+        if self._accessed:
+            self._connection.executemany(
+                "UPDATE responses SET last_access = ? WHERE endpoint = ? AND url = ?",
+                [(accessed_at, endpoint, url) for (endpoint, url), accessed_at in self._accessed.items()]
+            )
+            self._accessed = dict()
+
+    def _evict(self) -> None:
+        now = time.time()
+        expired_size, expired_count = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses WHERE expires_at < ?", (now,)
+        ).fetchone()
+        if expired_count:
+            self._connection.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._total_size -= expired_size
+
+        target_size = self.max_size_bytes * self.evict_to_ratio
+        evicted = []
+        cursor = self._connection.execute("SELECT rowid, size FROM responses ORDER BY last_access")
+        for rowid, size in cursor:
+            if self._total_size <= target_size:
+                break
+            evicted.append((rowid,))
+            self._total_size -= size
+        cursor.close()
+        self._connection.executemany("DELETE FROM responses WHERE rowid = ?", evicted)
+
+        logger.info(f"Response cache: {expired_count} expired and {len(evicted)} least recently used entries evicted")
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_accessed()
+            self._connection.commit()
+            self._connection.close()
@@ -0,0 +1,116 @@
+import logging
+import time
+from datetime import datetime, timedelta, time as day_time
+from typing import Callable
+
+from exceptions import CliArgumentError
+
+logger = logging.getLogger(__name__)
+
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class ScheduleEntry:
+    """Расписание одного отчета: каждый день (daily), по дню недели (mon...sun) или по числу месяца (1...31)"""
+
+    def __init__(self, action: str, day: str, at: day_time):
+        self.action = action
+        self.day = day
+        self.at = at
+
+    @classmethod
+    def parse(cls, text: str) -> "ScheduleEntry":
+        """Разбирает запись вида `действие=день ЧЧ:ММ`, например `current-week=mon 09:00`"""
+        action, _, when = text.partition("=")
+        day, _, at = when.strip().partition(" ")
+        try:
+            at = datetime.strptime(at.strip(), "%H:%M").time()
+        except ValueError:
+            raise CliArgumentError(f"Неверное время в расписании: {text}")
+
+        if day != "daily" and day not in WEEKDAYS and not (day.isdigit() and 1 <= int(day) <= 31):
+            raise CliArgumentError(f"Неверный день в расписании: {text}\n"
+                                   f"Используйте daily, {', '.join(WEEKDAYS)} или число месяца")
+        return cls(action.strip(), day, at)
+
+    def _matches(self, day) -> bool:
+        if self.day == "daily":
+            return True
+        if self.day in WEEKDAYS:
+            return day.weekday() == WEEKDAYS.index(self.day)
+        return day.day == int(self.day)
+
+    def next_run(self, after: datetime) -> datetime:
+        """Ближайшее время запуска строго после after"""
+        # За 62 дня встретится любое число месяца, которое вообще бывает в календаре
+        for offset in range(63):
+            day = after.date() + timedelta(days=offset)
+            run_at = datetime.combine(day, self.at)
+            if run_at > after and self._matches(day):
+                return run_at
+        raise CliArgumentError(f"В расписании отчета {self.action} нет ни одного дня запуска")
+
+
+def parse_schedule(text: str) -> list:
+    """Разбирает расписание из нескольких записей через точку с запятой"""
+    return [ScheduleEntry.parse(item) for item in text.split(";") if item.strip()]
+
+
+class Scheduler:
+    """Планировщик отчетов для долгоживущего процесса.
+
+    Ждет ближайшего запуска по расписанию. За prefetch_lead до него вызывает prefetch со списком
+    отчетов, которые должны выполниться в это время, чтобы данные успели загрузиться заранее,
+    а в назначенное время вызывает run. Ошибки записываются в лог и не останавливают планировщик.
+    """
+
+    def __init__(self, entries: list, prefetch: Callable[[list], None], run: Callable[[list], None],
+                 prefetch_lead: timedelta = timedelta(minutes=30),
+                 clock: Callable[[], datetime] = datetime.now, sleep: Callable[[float], None] = time.sleep):
+        self.entries = entries
+        self.prefetch_lead = prefetch_lead
+        self._prefetch = prefetch
+        self._run = run
+        self._clock = clock
+        self._sleep = sleep
+
+        self._last_run_at = None
+
+    def get_next_run(self) -> tuple[datetime, list]:
+        """Время ближайшего запуска и отчеты, которые запускаются в это время"""
+        now = self._clock()
+        # Если часы отстали от времени последнего запуска, он не должен повториться
+        after = max(now, self._last_run_at) if self._last_run_at else now
+
+        runs = [(entry.next_run(after), entry.action) for entry in self.entries]
+        run_at = min(run_at for run_at, _ in runs)
+        actions = list(dict.fromkeys(action for entry_run_at, action in runs if entry_run_at == run_at))
+        return run_at, actions
+
+    def _sleep_until(self, moment: datetime) -> None:
+        delay = (moment - self._clock()).total_seconds()
+        if delay > 0:
+            self._sleep(delay)
+
+    def _call(self, name: str, func: Callable[[list], None], actions: list) -> None:
+        try:
+            func(actions)
+        except Exception as err:
+            logger.error(f"Scheduled {name} of {', '.join(actions)} failed: {err}", exc_info=True)
+
+    def run_pending(self) -> None:
+        """Дожидается ближайшего запуска: загружает данные заранее и строит отчеты"""
+        run_at, actions = self.get_next_run()
+        logger.info(f"Next run at {run_at:%Y-%m-%d %H:%M}: {', '.join(actions)}")
+
+        self._sleep_until(run_at - self.prefetch_lead)
+        self._call("prefetch", self._prefetch, actions)
+
+        self._sleep_until(run_at)
+        self._call("run", self._run, actions)
+        self._last_run_at = run_at
+
+    def run_forever(self) -> None:
+        while True:
+            self.run_pending()
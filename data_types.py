@@ -1,10 +1,12 @@
 import logging
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date
 from enum import Enum
-from typing import TypedDict
+from typing import Callable, NamedTuple, TypedDict
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, filename="logs.log",
-                    format="%(asctime)s::%(levelname)s::%(message)s")
 
 
 class Statuses(TypedDict):
@@ -23,52 +25,216 @@ class StatusesEnum(Enum):
     ATTEND = "a9ff5b2c-f5f9-cb83-a512-9ba807f74fd2"
 
 
+class Attendee(NamedTuple):
+    """Ученик на занятии: только поля, которые используют отчеты"""
+    student_id: str | None
+    student_name: str | None
+    status_id: str | None
+
+
+class Attendance(NamedTuple):
+    """Занятие из ответа Paraplan (групповое или индивидуальное), сжатое до полей, которые используют отчеты"""
+    hour: int | None
+    minute: int | None
+    teachers: tuple
+    attendees: tuple
+
+
 class TeachersAttendancesStats:
+    """Накопитель статистики посещений по преподавателям.
 
-    data = dict()
+    Для каждого преподавателя хранится список счетчиков: по слоту на каждый учитываемый статус
+    и последний слот - количество проведенных занятий. Накопители можно заполнять независимо
+    (по дням, в разных потоках или процессах) и объединять через merge().
+    """
 
-    @classmethod
-    def get_stats(cls):
-        result = cls.data.copy()
-        cls.data = dict()
-        return result
+    STATUS_NAMES = ("ATTENDED_TRIAL", "WORKED_OUT", "SKIP", "ATTEND")
+    STATUS_SLOTS = {
+        StatusesEnum.ATTENDED_TRIAL.value: 0,
+        StatusesEnum.WORKED_OUT.value: 1,
+        StatusesEnum.SKIP.value: 2,
+        StatusesEnum.ATTEND.value: 3,
+    }
+    # Пропуск не делает занятие проведенным
+    COUNTING_SLOTS = (True, True, False, True)
+    ATTENDANCES_COUNT_SLOT = len(STATUS_NAMES)
 
-    @classmethod
-    def _init_teacher(cls, teacher: str):
-        if teacher in cls.data.keys():
-            return
+    def __init__(self):
+        self.data = dict()
 
-        cls.data[teacher] = {
-            "statuses": {
-                "ATTENDED_TRIAL": 0,
-                "WORKED_OUT": 0,
-                "SKIP": 0,
-                "ATTEND": 0,
-            },
-            "attendances_count": 0
-        }
+    def _get_counters(self, teacher: str) -> list:
+        counters = self.data.get(teacher)
+        if counters is None:
+            counters = self.data[teacher] = [0] * (self.ATTENDANCES_COUNT_SLOT + 1)
+        return counters
 
-    @classmethod
-    def add_teacher_attendance_stats(cls, attendance):
-        if not attendance["teacherList"]:
+    def add_teacher_attendance_stats(self, attendance: Attendance):
+        if not attendance.teachers:
             return
-        teacher = attendance["teacherList"][0]["teacherInfo"]["name"]
-        cls._init_teacher(teacher)
+        counters = self._get_counters(attendance.teachers[0])
 
         counting = False
-        for attendee in attendance["attendeeList"]:
-            status_id = attendee["statusId"]
-            if status_id == StatusesEnum.ATTENDED_TRIAL.value:
-                cls.data[teacher]["statuses"]["ATTENDED_TRIAL"] += 1
-                counting = True
-            elif status_id == StatusesEnum.WORKED_OUT.value:
-                cls.data[teacher]["statuses"]["WORKED_OUT"] += 1
-                counting = True
-            elif status_id == StatusesEnum.ATTEND.value:
-                cls.data[teacher]["statuses"]["ATTEND"] += 1
-                counting = True
-            elif status_id == StatusesEnum.SKIP.value:
-                cls.data[teacher]["statuses"]["SKIP"] += 1
+        for attendee in attendance.attendees:
+            slot = self.STATUS_SLOTS.get(attendee.status_id)
+            if slot is None:
+                continue
+            counters[slot] += 1
+            counting = counting or self.COUNTING_SLOTS[slot]
 
         if counting:
-            cls.data[teacher]["attendances_count"] += 1
+            counters[self.ATTENDANCES_COUNT_SLOT] += 1
+
+    def add_counts(self, teacher: str, statuses: dict, attendances_count: int) -> None:
+        """Добавляет уже подсчитанные значения: {статус: количество учеников} и количество проведенных занятий"""
+        counters = self._get_counters(teacher)
+        for status_id, count in statuses.items():
+            slot = self.STATUS_SLOTS.get(status_id)
+            if slot is not None:
+                counters[slot] += count
+        counters[self.ATTENDANCES_COUNT_SLOT] += attendances_count
+
+    def merge(self, other: "TeachersAttendancesStats") -> "TeachersAttendancesStats":
+        """Возвращает новый накопитель с суммой счетчиков. Преподаватели идут в порядке первого появления"""
+        merged = TeachersAttendancesStats()
+        for stats in (self, other):
+            for teacher, counters in stats.data.items():
+                merged_counters = merged._get_counters(teacher)
+                for slot, value in enumerate(counters):
+                    merged_counters[slot] += value
+        return merged
+
+    def get_stats(self) -> dict:
+        return {
+            teacher: {
+                "statuses": dict(zip(self.STATUS_NAMES, counters)),
+                "attendances_count": counters[self.ATTENDANCES_COUNT_SLOT]
+            }
+            for teacher, counters in self.data.items()
+        }
+
+
+def _subscription_date(subscription_date: dict | None) -> date | None:
+    if not subscription_date:
+        return None
+    return date(subscription_date["year"], subscription_date["month"], subscription_date["day"])
+
+
+class SubscriptionsIndex:
+    """Индекс абонементов ученика, построенный по полной истории абонементов.
+
+    Абонементы отсортированы по дате окончания, поэтому выборки по периодам выполняются
+    бинарным поиском без дополнительных запросов к API. Результаты возвращаются в том же
+    порядке, в котором абонементы пришли от сервера.
+    """
+
+    def __init__(self, subscriptions: list):
+        self._subscriptions = subscriptions
+
+        entries = sorted(
+            (_subscription_date(subscription["endDate"]), position)
+            for position, subscription in enumerate(subscriptions)
+        )
+        self._end_dates = [end_date for end_date, _ in entries]
+        self._positions = [position for _, position in entries]
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def all(self) -> list:
+        return list(self._subscriptions)
+
+    def _positions_ending_in(self, period: tuple[date | None, date | None]) -> list:
+        start = bisect_left(self._end_dates, period[0]) if period[0] else 0
+        end = bisect_right(self._end_dates, period[1]) if period[1] else len(self._end_dates)
+        return sorted(self._positions[start:end])
+
+    def ending_in(self, period: tuple[date | None, date | None]) -> list:
+        """Абонементы, дата окончания которых попадает в период"""
+        return [self._subscriptions[position] for position in self._positions_ending_in(period)]
+
+    def active_in(self, period: tuple[date | None, date | None]) -> list:
+        """Абонементы, действующие в периоде (аналог фильтрации параметрами from/to на сервере)"""
+        subscriptions = [self._subscriptions[position] for position in self._positions_ending_in((period[0], None))]
+        if not period[1]:
+            return subscriptions
+
+        return [
+            subscription for subscription in subscriptions
+            if not subscription.get("startDate") or _subscription_date(subscription["startDate"]) <= period[1]
+        ]
+
+
+class SingleFlight:
+    """Однократная загрузка значения по ключу, даже если его одновременно запрашивают несколько потоков.
+
+    lock - блокировка кэша владельца: cached вызывается под ней, поэтому значение, сохраненное
+    загрузившим потоком, видно остальным сразу после окончания загрузки.
+    """
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self._loading = dict()
+
+    def run(self, key, cached: Callable[[], object | None], load: Callable[[], object]):
+        """Возвращает cached(), а если значения нет - результат load(), который выполняется одним потоком"""
+        while True:
+            with self._lock:
+                value = cached()
+                if value is not None:
+                    return value
+
+                loaded = self._loading.get(key)
+                if loaded is None:
+                    loaded = self._loading[key] = threading.Event()
+                    break
+
+            # Значение уже загружает другой поток - ждем его результата
+            loaded.wait()
+
+        try:
+            return load()
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loaded.set()
+
+
+class GroupDirectory:
+    """Справочник групп на время работы скрипта: тип группы и первый преподаватель по id группы.
+
+    Информация о группе запрашивается через fetch_group один раз, даже если группу одновременно
+    запрашивают несколько потоков. Справочник ограничен max_size записями, при переполнении
+    вытесняются группы, к которым дольше всего не обращались.
+    """
+
+    def __init__(self, fetch_group: Callable[[str], dict], max_size: int = 1024):
+        self._fetch_group = fetch_group
+        self.max_size = max_size
+
+        self._groups = OrderedDict()
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight(self._lock)
+
+    @staticmethod
+    def _compact(group_info: dict) -> dict:
+        return {
+            "type": group_info.get("type"),
+            "teacher": group_info["teacherList"][0]["name"] if group_info["teacherList"] else "-"
+        }
+
+    def get(self, group_id: str) -> dict:
+        return self._single_flight.run(group_id, lambda: self._get_cached(group_id), lambda: self._load(group_id))
+
+    def _get_cached(self, group_id: str) -> dict | None:
+        if group_id in self._groups:
+            self._groups.move_to_end(group_id)
+            return self._groups[group_id]
+        return None
+
+    def _load(self, group_id: str) -> dict:
+        group = self._compact(self._fetch_group(group_id))
+        with self._lock:
+            self._groups[group_id] = group
+            if len(self._groups) > self.max_size:
+                self._groups.popitem(last=False)
+        return group
@@ -0,0 +1,58 @@
+"""Разбор ответов Paraplan.
+
+JSON разбирается парсером orjson, если он установлен, иначе стандартным json. Ответы с занятиями
+сразу после разбора сжимаются до записей Attendance: отчеты используют только преподавателей,
+учеников со статусами и время занятия, а полные словари ответа за месяц занимают мегабайты памяти.
+"""
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:  # orjson не установлен - используется стандартный json
+    orjson = None
+
+from data_types import Attendance, Attendee
+
+
+def loads(body: str | bytes):
+    """Разбирает JSON-ответ или тело из кэша"""
+    if orjson:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _intern(value: str | None) -> str | None:
+    # Имена преподавателей и статусы повторяются в тысячах занятий - храним по одной копии строки
+    return sys.intern(value) if value else value
+
+
+def parse_attendance(attendance: dict) -> Attendance:
+    """Сжимает занятие из ответа Paraplan до записи Attendance"""
+    date_time = attendance.get("dateTime") or {}
+    attendees = []
+    for attendee in attendance.get("attendeeList") or []:
+        student_info = attendee.get("studentInfo") or {}
+        attendees.append(Attendee(student_info.get("id"), student_info.get("name"),
+                                  _intern(attendee.get("statusId"))))
+
+    return Attendance(
+        hour=date_time.get("hour"),
+        minute=date_time.get("minute"),
+        teachers=tuple(_intern(teacher["teacherInfo"]["name"]) for teacher in attendance.get("teacherList") or []),
+        attendees=tuple(attendees),
+    )
+
+
+def parse_group_breakdown(response: dict) -> list:
+    """id групповых занятий дня из групповой разбивки"""
+    return [attendance.get("id") for attendance in response["breakdown"]["attendanceList"]]
+
+
+def parse_individual_breakdown(response: dict) -> list:
+    """Индивидуальные занятия дня из индивидуальной разбивки: группы разворачиваются в один список"""
+    return [
+        parse_attendance(attendance)
+        for group in response["groupList"]
+        for attendance in group.get("attendanceList", [])
+    ]
@@ -4,3 +4,11 @@ class AuthError(Exception):
 
 class CsrfTokenError(Exception):
     pass
+
+
+class CliArgumentError(Exception):
+    pass
+
+
+class BotConfigError(Exception):
+    pass
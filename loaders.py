@@ -0,0 +1,123 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def get_period_days(period: tuple[date, date]) -> list:
+    start_date, end_date = period
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+class BreakdownScanner:
+    """Сканер разбивок посещений по дням.
+
+    Период делится на дни, разбивки всех видов (групповые, индивидуальные) за все дни запрашиваются
+    параллельно, результаты собираются по порядку дат. Частоту запросов ограничивает транспорт.
+    Уже полученные дни повторно не запрашиваются.
+    """
+
+    def __init__(self, fetchers: dict, max_workers: int = 1):
+        self._fetchers = fetchers
+        self.max_workers = max_workers
+
+        self._partitions = dict()
+        self._lock = threading.Lock()
+
+    def _fetch(self, task: tuple[str, date]):
+        kind, day = task
+        return self._fetchers[kind](day)
+
+    def scan(self, period: tuple[date, date], kinds: tuple | None = None) -> dict:
+        """Возвращает разбивки периода: {дата: {вид разбивки: результат}} в порядке дат"""
+        kinds = kinds or tuple(self._fetchers)
+        days = get_period_days(period)
+
+        with self._lock:
+            tasks = [(kind, day) for day in days for kind in kinds if (kind, day) not in self._partitions]
+            if self.max_workers == 1 or len(tasks) < 2:
+                results = [self._fetch(task) for task in tasks]
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    results = list(executor.map(self._fetch, tasks))
+
+            self._partitions.update(zip(tasks, results))
+            if tasks:
+                logger.info(f"Breakdowns scanned: {len(tasks)} day partitions")
+
+            return {day: {kind: self._partitions[(kind, day)] for kind in kinds} for day in days}
+
+    def clear(self, since: date | None = None) -> None:
+        """Забывает полученные разбивки: все или только за дни начиная с since"""
+        with self._lock:
+            if since is None:
+                self._partitions.clear()
+                return
+
+            for task in [task for task in self._partitions if task[1] >= since]:
+                del self._partitions[task]
+
+
+class AttendanceLoader:
+    """Загрузчик подробностей групповых занятий (forAttendanceScreen) за период.
+
+    Списки id занятий по дням берутся из групповых разбивок сканера, затем подробности всех еще
+    не загруженных занятий запрашиваются параллельно. Загруженные занятия хранятся по id, поэтому
+    каждое занятие скачивается один раз, сколько бы отчетов его ни использовали.
+    """
+
+    def __init__(self, scanner: BreakdownScanner, get_attendance: Callable[[str, date], dict],
+                 max_workers: int = 1):
+        self._scanner = scanner
+        self._get_attendance = get_attendance
+        self.max_workers = max_workers
+
+        self._attendances = dict()
+        self._days = dict()
+        self._lock = threading.Lock()
+
+    def _map(self, func: Callable, items: list) -> list:
+        if self.max_workers == 1 or len(items) < 2:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, items))
+
+    def load(self, period: tuple[date, date]) -> dict:
+        """Возвращает занятия периода: {дата: [занятие, ...]} в порядке дат и занятий внутри дня"""
+        with self._lock:
+            days = get_period_days(period)
+
+            missing_days = [day for day in days if day not in self._days]
+            if missing_days:
+                for day, breakdowns in self._scanner.scan((missing_days[0], missing_days[-1]), ("group",)).items():
+                    self._days[day] = breakdowns["group"]
+
+            missing_attendances = list({
+                attendance_id: day
+                for day in missing_days for attendance_id in self._days[day]
+                if attendance_id not in self._attendances
+            }.items())
+            attendances = self._map(lambda item: self._get_attendance(*item), missing_attendances)
+            for (attendance_id, _), attendance in zip(missing_attendances, attendances):
+                self._attendances[attendance_id] = attendance
+
+            if missing_days:
+                logger.info(f"Attendances loaded: {len(missing_days)} days, {len(missing_attendances)} attendances")
+
+            return {day: [self._attendances[attendance_id] for attendance_id in self._days[day]] for day in days}
+
+    def clear(self, since: date | None = None) -> None:
+        """Забывает загруженные занятия: все или только за дни начиная с since"""
+        with self._lock:
+            if since is None:
+                self._attendances.clear()
+                self._days.clear()
+                return
+
+            for day in [day for day in self._days if day >= since]:
+                for attendance_id in self._days.pop(day):
+                    self._attendances.pop(attendance_id, None)
@@ -0,0 +1,109 @@
+"""Настройка логирования в logs.log.
+
+Записи передаются через очередь: потоки, которые загружают данные, только кладут запись в очередь,
+а в файл ее пишет отдельный поток QueueListener. Поэтому запись в файл не блокирует запросы к Paraplan.
+Логирование настраивается один раз при первом вызове setup_logging, повторные вызовы ничего не меняют.
+
+Для циклов по ученикам вместо строки на каждого ученика используется ProgressLogger: он пишет
+сводку вида "processed 500/3200 students, 42 req/s" раз в every элементов или раз в interval секунд.
+"""
+import atexit
+import logging
+import multiprocessing.util
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable
+
+LOG_FORMAT = "%(asctime)s::%(levelname)s::%(message)s"
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(filename: str = "logs.log", level: int = logging.INFO) -> None:
+    """Подключает к корневому логгеру запись в файл через очередь"""
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener:
+            return
+
+        file_handler = logging.FileHandler(filename, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = QueueHandler(log_queue)
+        _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(_queue_handler)
+
+        # Записи, оставшиеся в очереди, дописываются в файл при завершении процесса
+        atexit.register(_stop_listener)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def _stop_listener() -> None:
+    if _listener and _listener._thread:
+        _listener.stop()
+
+
+def _restart_in_child() -> None:
+    # Поток записи не переживает fork: дочерний процесс (например, компания в tenants.py) запускает свой
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+    # Процессы пула multiprocessing завершаются без atexit, но вызывают финализаторы
+    multiprocessing.util.Finalize(None, _stop_listener, exitpriority=0)
+
+
+class ProgressLogger:
+    """Сводка о ходе обработки элементов вместо записи на каждый элемент
+
+    requests_count - функция, возвращающая количество выполненных запросов, для расчета req/s.
+    Записи содержат поля processed, total и rps (extra), которые доступны обработчикам логов.
+    """
+
+    def __init__(self, logger: logging.Logger, total: int, items: str = "students", every: int = 500,
+                 interval: float = 10.0, requests_count: Callable[[], int] | None = None):
+        self.logger = logger
+        self.total = total
+        self.items = items
+        self.every = every
+        self.interval = interval
+        self.requests_count = requests_count
+        self.processed = 0
+        self._started_at = time.monotonic()
+        self._logged_at = self._started_at
+        self._start_requests = requests_count() if requests_count else 0
+        self._lock = threading.Lock()
+
+    def step(self, count: int = 1) -> None:
+        with self._lock:
+            self.processed += count
+            now = time.monotonic()
+            if (self.processed % self.every and self.processed != self.total
+                    and now - self._logged_at < self.interval):
+                return
+            self._logged_at = now
+            processed = self.processed
+
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+
+        elapsed = max(now - self._started_at, 1e-9)
+        if self.requests_count:
+            rps = (self.requests_count() - self._start_requests) / elapsed
+            self.logger.info("processed %d/%d %s, %.0f req/s", processed, self.total, self.items, rps,
+                             extra={"processed": processed, "total": self.total, "rps": rps})
+        else:
+            self.logger.info("processed %d/%d %s", processed, self.total, self.items,
+                             extra={"processed": processed, "total": self.total})
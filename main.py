@@ -1,48 +1,56 @@
 from pprint import pprint
 
-import requests
 import json
 from typing import Literal
 from datetime import date, timedelta
 import calendar
-import openpyxl
 import sys
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, deque
+from contextlib import contextmanager
+from itertools import compress, zip_longest
+from typing import Callable, Iterator
 from dotenv import load_dotenv
 
-from exceptions import AuthError, CsrfTokenError
-from data_types import StatusesEnum, TeachersAttendancesStats
-from bot import send_report_to_tg
+from attendance_store import AttendanceStore
+from cache import ResponseCache
+from daemon import Scheduler, parse_schedule
+from server import ReportService, ReportsServer
+from exceptions import AuthError, BotConfigError, CliArgumentError, CsrfTokenError
+from log_config import ProgressLogger, setup_logging
+from loaders import AttendanceLoader, BreakdownScanner
+from metrics import Metrics
+from session_store import SessionStore
+from snapshot import StudentsSnapshot
+from data_types import Attendance, GroupDirectory, StatusesEnum, SubscriptionsIndex
+from decoding import loads, parse_attendance, parse_group_breakdown, parse_individual_breakdown
+from stand_in import Recorder
+from transport import RateLimiter, Transport
+from trends import TrendStore, create_trends_report
+from writers import REPORT_WRITERS, ReportWriter, create_report_writer
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, filename="logs.log",
-                    format="%(asctime)s::%(levelname)s::%(message)s")
+setup_logging()
 
 load_dotenv()
 
 
 class ParaplanAPI:
-    BASE_URL = "https://paraplancrm.ru/"
+    BASE_URL = os.getenv("PARAPLAN_BASE_URL", "https://paraplancrm.ru/")
     USER_URL = BASE_URL + "api/open/user"
     LOGIN_URL = BASE_URL + "api/public/login"
     STUDENTS_URL = BASE_URL + "api/open/students/min-info"
     ATTENDANCES_STATUSES_URL = BASE_URL + "api/open/attendances/students/statuses"
-    ATTENDANCES_URL_TEMPLATE = BASE_URL + "api/open/company/attendances/breakdown/group?date.year={year}&date.month={month}&date.day={day}&scheduleBreakdownAccessTypeSet=ATTENDANCES&scheduleBreakdownAccessTypeSet=LESSONS&scheduleBreakdownAccessTypeSet=PREBOOKINGS&scheduleBreakdownAccessTypeSet=SCHEDULE_MODIFICATIONS"
-    IND_ATTENDANCES_URL_TEMPLATE = BASE_URL + "api/open/company/attendances/breakdown/individual?date.year={year}&date.month={month}&date.day={day}&scheduleBreakdownAccessTypeSet=ATTENDANCES&scheduleBreakdownAccessTypeSet=LESSONS&scheduleBreakdownAccessTypeSet=PREBOOKINGS&scheduleBreakdownAccessTypeSet=SCHEDULE_MODIFICATIONS"
+    ATTENDANCES_URL_TEMPLATE = BASE_URL + "api/open/company/attendances/breakdown/group?date.year={year}&date.month={month}&date.day={day}{access_types}"
+    IND_ATTENDANCES_URL_TEMPLATE = BASE_URL + "api/open/company/attendances/breakdown/individual?date.year={year}&date.month={month}&date.day={day}{access_types}"
     ATTENDANCES_FOR_SCREEN_URL_TEMPLATE = BASE_URL + "api/open/company/attendances/{attendance_id}/forAttendanceScreen"
-    STUDENT_SUBSCRIPTIONS_URL_TEMPLATE = BASE_URL + "/api/open/students/{student_id}/subscriptions/paginated?page=1&size=10"
+    STUDENT_SUBSCRIPTIONS_URL_TEMPLATE = BASE_URL + "/api/open/students/{student_id}/subscriptions/paginated?page={page}&size={size}"
     GROUP_INFO_URL_TEMPLATE = BASE_URL + "api/open/groups/{group_id}"
     STUDENT_CARD_URL_TEMPLATE = "https://paraplancrm.ru/crm/#/students/{student_id}/groups"
 
-    LOGIN_DATA = json.dumps({
-        "username": os.getenv("LOGIN", None),
-        "password": os.getenv("PASS", None),
-        "locale": "RU",
-        "loginType": "KIDS_APP",
-        "rememberMe": False,
-        "captcha": ""
-    })
     STUDENTS_DATA = json.dumps({
         "currentOnly": False
     })
@@ -51,11 +59,157 @@ class ParaplanAPI:
         'Content-Type': 'application/json',
     }
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.request("POST", self.LOGIN_URL, headers=self.HEADERS, data=self.LOGIN_DATA)
+    SUBSCRIPTIONS_MAX_PAGE_SIZE = 100
+    # Из разбивок посещений отчетам нужны только занятия, расписание и записи не запрашиваются
+    BREAKDOWN_ACCESS_TYPES = ("ATTENDANCES",)
+    ALL_BREAKDOWN_ACCESS_TYPES = ("ATTENDANCES", "LESSONS", "PREBOOKINGS", "SCHEDULE_MODIFICATIONS")
+    TRIAL_STATUSES = (StatusesEnum.ATTENDED_TRIAL.value, StatusesEnum.ATTENDED_FREE_TRIAL.value)
+    WEEKDAY_NAMES = ("Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье")
+
+    def __init__(self, max_workers: int = 1, cache: ResponseCache | None = None, subscriptions_page_size: int = 10,
+                 rate_limit: float | None = None, timeout: float = 60, retries: int = 3,
+                 session_store: SessionStore | None = None, snapshot: StudentsSnapshot | None = None,
+                 prune_students: bool = True, login: str | None = None, password: str | None = None,
+                 breakdown_access_types: tuple = BREAKDOWN_ACCESS_TYPES,
+                 attendance_store: AttendanceStore | None = None, trends: TrendStore | None = None):
+        # Учетные данные и заголовки принадлежат экземпляру: в одном процессе могут работать несколько компаний
+        self.username = login if login is not None else os.getenv("LOGIN", None)
+        self.login_data = json.dumps({
+            "username": self.username,
+            "password": password if password is not None else os.getenv("PASS", None),
+            "locale": "RU",
+            "loginType": "KIDS_APP",
+            "rememberMe": False,
+            "captcha": ""
+        })
+        self.headers = dict(self.HEADERS)
+
+        self.max_workers = max(1, max_workers)
+        self.breakdown_access_types = "".join(f"&scheduleBreakdownAccessTypeSet={access_type}"
+                                              for access_type in breakdown_access_types)
+        self.cache = cache
+        self.snapshot = snapshot
+        self.prune_students = prune_students
+        self.session_store = session_store
+        self.metrics = Metrics()
+        self.subscriptions_page_size = subscriptions_page_size
+        self.groups = GroupDirectory(self._get_group_info)
+        self.breakdowns = BreakdownScanner(
+            {"group": self._get_attendances_ids, "individual": self._get_individual_attendances},
+            self.max_workers
+        )
+        self.group_attendances = AttendanceLoader(self.breakdowns, self._get_attendance, self.max_workers)
+        self.attendance_store = attendance_store if attendance_store is not None else AttendanceStore()
+        self._attendance_store_lock = threading.Lock()
+        self.trends = trends
+
+        # Данные, общие для всех отчетов одного запуска
+        self._students = None
+        self._subscriptions_indexes = dict()
+        # Результаты проверок (ученик, дата) -> есть ли абонемент после даты, для учеников без индекса
+        self._subscribed_since = dict()
+        # Самая ранняя дата, после которой у ученика без индекса точно нет абонементов
+        self._unsubscribed_since = dict()
+        self._run_data_lock = threading.Lock()
+        self._known_end_dates = None
+        self._snapshot_lock = threading.Lock()
+        # Время сохранения текущей сессии в хранилище
+        self._session_saved_at = 0.0
+
+        self.transport = Transport(
+            pool_size=self.max_workers,
+            timeout=timeout,
+            retries=retries,
+            rate_limiter=RateLimiter(rate_limit, burst=self.max_workers) if rate_limit else None,
+            reauthenticate=self._reauthenticate,
+            metrics=self.metrics
+        )
+        self.session = self.transport.session
+        self._authenticate()
+
+        self.refresh_periods()
+
+    def refresh_periods(self) -> None:
+        """Пересчитывает периоды отчетов от сегодняшней даты (для процесса, который работает несколько дней)"""
+        self.current_month_period = self._get_month_period("current")
+        self.previous_month_period = self._get_month_period("previous")
+        self.next_month_period = self._get_month_period("next")
+        self.current_week_period = self._get_current_week_period()
+        self.after_current_week_period = self._get_period_after_current_week()
+
+    def set_report_period(self, period: tuple[date, date]) -> None:
+        """Задает произвольный период для всех отчетов вместо месяцев и недель, отсчитанных от сегодняшней даты
 
-        if self.session.get(self.USER_URL).status_code != 200:
+        Отчеты по посещениям и прогноз строятся за period. Непродленные абонементы - это действовавшие
+        в предыдущем периоде такой же длины и не продленные в period. В отчете по неделе берутся абонементы,
+        которые заканчиваются в period, продлившими считаются ученики с абонементом, заканчивающимся позже.
+        """
+        start_date, end_date = period
+        self.current_month_period = period
+        self.previous_month_period = (start_date - (end_date - start_date) - timedelta(days=1),
+                                      start_date - timedelta(days=1))
+        self.next_month_period = period
+        self.current_week_period = period
+        self.after_current_week_period = (end_date + timedelta(days=1), None)
+
+    def reset_run_data(self, keep_before: date | None = None) -> None:
+        """Сбрасывает загруженные данные перед следующим запуском отчетов в том же процессе
+
+        Разбивки и занятия за дни раньше keep_before остаются в памяти: прошедшие дни уже не меняются.
+        """
+        with self._run_data_lock:
+            self._students = None
+            self._subscriptions_indexes = dict()
+            self._subscribed_since = dict()
+            self._unsubscribed_since = dict()
+        with self._snapshot_lock:
+            self._known_end_dates = None
+        self.groups.clear()
+        self.attendance_store.clear(since=keep_before)
+
+    def _authenticate(self, reauthenticate: bool = False) -> None:
+        """Восстанавливает сохраненную сессию, а если ее нет или она истекла - выполняет вход и сохраняет сессию
+
+        При повторном входе, когда сервер отклонил текущую сессию, сохраненная сессия используется, только
+        если она сохранена позже текущей (например, другой процесс уже выполнил вход).
+        """
+        if not self.session_store:
+            self._login()
+            return
+
+        key = f"{self.BASE_URL} {self.username}"
+        with self.session_store.lock():
+            stored_session = self.session_store.load(key)
+            if stored_session:
+                cookies, csrf_token, saved_at = stored_session
+                # Сессию, которую сервер только что отклонил, восстанавливать бессмысленно
+                is_usable = not reauthenticate or saved_at > self._session_saved_at
+                if is_usable and self._restore_session(cookies, csrf_token):
+                    self._session_saved_at = saved_at
+                    return
+
+            self._login()
+            self._session_saved_at = self.session_store.save(key, self.session.cookies, self._get_csrf_token())
+
+    def _reauthenticate(self) -> None:
+        self._authenticate(reauthenticate=True)
+
+    def _restore_session(self, cookies, csrf_token: str) -> bool:
+        self.session.cookies.clear()
+        self.session.cookies.update(cookies)
+
+        if self.transport.get(self.USER_URL, retry_auth=False).status_code != 200:
+            logger.info("Stored Paraplan session expired")
+            return False
+
+        self._update_csrf_in_headers(csrf_token)
+        logger.info("Restored stored Paraplan session")
+        return True
+
+    def _login(self) -> None:
+        self.transport.post(self.LOGIN_URL, retry_auth=False, headers=self.headers, data=self.login_data)
+
+        if self.transport.get(self.USER_URL, retry_auth=False).status_code != 200:
             raise AuthError("Не удалось залогиниться")
 
         csrf_token = self._get_csrf_token()
@@ -63,18 +217,13 @@ class ParaplanAPI:
             raise CsrfTokenError("Не удалось получить CSRF токен")
 
         self._update_csrf_in_headers(csrf_token)
-
-        self.current_month_period = self._get_month_period("current")
-        self.previous_month_period = self._get_month_period("previous")
-        self.next_month_period = self._get_month_period("next")
-        self.current_week_period = self._get_current_week_period()
-        self.after_current_week_period = self._get_period_after_current_week()
+        logger.info("Logged in to Paraplan")
 
     def _get_csrf_token(self):
         return self.session.cookies.get("XSRF-TOKEN")
 
     def _update_csrf_in_headers(self, csrf_token):
-        self.HEADERS["X-XSRF-TOKEN"] = csrf_token
+        self.headers["X-XSRF-TOKEN"] = csrf_token
 
     @staticmethod
     def _get_month_period(period: Literal["current", "previous", "next"]) -> tuple[date, date]:
@@ -114,10 +263,6 @@ class ParaplanAPI:
                   7: "Июля", 8: "Августа", 9: "Сентября", 10: "Октября", 11: "Ноября", 12: "Декабря"}
         return f"{end_date['day']} {months[end_date['month']]} {end_date['year']}"
 
-    @staticmethod
-    def _convert_subs_end_date_to_date(end_date: dict):
-        return date(end_date["year"], end_date["month"], end_date["day"])
-
     @staticmethod
     def _get_start_period_parameters(start_date: date):
         return f"&from.day={start_date.day}&from.month={start_date.month}&from.year={start_date.year}"
@@ -126,407 +271,590 @@ class ParaplanAPI:
     def _get_end_period_parameters(end_date: date):
         return f"&to.day={end_date.day}&to.month={end_date.month}&to.year={end_date.year}"
 
+    def _imap_students(self, func: Callable, students: list) -> Iterator:
+        """Применяет func к каждому ученику и отдает результаты по мере готовности, сохраняя порядок учеников.
+
+        При max_workers > 1 запросы по ученикам выполняются параллельно в пуле потоков. Одновременно
+        в работе не больше 2 * max_workers учеников, поэтому результаты не копятся, если запись
+        отчета отстает от загрузки. Ход обработки пишется в лог сводками ProgressLogger.
+        """
+        progress = ProgressLogger(logger, len(students), requests_count=self.metrics.requests_count)
+        if self.max_workers == 1:
+            for student in students:
+                yield func(student)
+                progress.step()
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for student in students:
+                pending.append(executor.submit(func, student))
+                if len(pending) >= 2 * self.max_workers:
+                    yield pending.popleft().result()
+                    progress.step()
+
+            while pending:
+                yield pending.popleft().result()
+                progress.step()
+
+    def _map_students(self, func: Callable, students: list) -> list:
+        return list(self._imap_students(func, students))
+
+    def _get_json(self, url: str, endpoint: str | None = None, day: date | None = None) -> dict:
+        """GET-запрос с использованием кэша ответов
+
+        endpoint - имя эндпоинта для выбора времени жизни записи в кэше, day - дата, к которой относятся данные
+        """
+        if self.cache and self.cache.is_cacheable(endpoint):
+            body = self.cache.get(endpoint, url)
+            self.metrics.observe_cache(endpoint, body is not None)
+            if body is not None:
+                return loads(body)
+
+        response = self.transport.get(url)
+        response.raise_for_status()
+        if self.cache and endpoint:
+            self.cache.set(endpoint, url, response.text, day)
+
+        return loads(response.content)
+
     def get_attendances_statuses(self):
 
-        return self.session.get(self.ATTENDANCES_STATUSES_URL).json()
+        return self._get_json(self.ATTENDANCES_STATUSES_URL)
 
     def _get_students(self) -> list:
-        response = self.session.post(self.STUDENTS_URL, headers=self.HEADERS, data=self.STUDENTS_DATA)
-        return response.json()["studentList"]
+        with self._run_data_lock:
+            if self._students is None:
+                response = self.transport.post(self.STUDENTS_URL, headers=self.headers, data=self.STUDENTS_DATA)
+                self._students = loads(response.content)["studentList"]
+            return self._students
 
-    def _get_student_subscriptions(self, student_id: str, period: tuple[date | None, date | None] = None,
-                                   filter_by_end_date: bool = False) -> list:
-        url = self.STUDENT_SUBSCRIPTIONS_URL_TEMPLATE.format(student_id=student_id)
+    @staticmethod
+    def _is_last_subscriptions_page(response: dict, page: int, page_size: int, received: int) -> bool:
+        # Сервер может урезать размер страницы, поэтому короткая страница - признак конца списка,
+        # только если сервер не сообщил, сколько всего абонементов или страниц
+        if not response.get("itemList"):
+            return True
+        total = response.get("totalCount", response.get("total"))
+        if total is not None:
+            return received >= total
+        if response.get("totalPages") is not None:
+            return page >= response["totalPages"]
+
+        return len(response.get("itemList") or []) < page_size
+
+    def _iter_student_subscriptions(self, student_id: str, period: tuple[date | None, date | None] = None,
+                                    page_size: int | None = None) -> Iterator[dict]:
+        """Постранично получает абонементы ученика и отдает их по одному
+
+        Первые страницы запрашиваются размером subscriptions_page_size, дальше размер страницы удваивается
+        (но не больше SUBSCRIPTIONS_MAX_PAGE_SIZE): если у ученика длинная история, лучше забрать ее
+        меньшим числом запросов. Следующая страница запрашивается только когда вызывающий код
+        дочитал предыдущую, поэтому при досрочной остановке лишних запросов не будет.
+        page_size задает размер первых страниц вместо subscriptions_page_size.
+
+        Если сервер вернул страницу меньше запрошенной, а по totalCount/totalPages список не закончился,
+        значит размер страницы на сервере ограничен: дальше страницы запрашиваются этого размера и не
+        удваиваются, а абонементы, полученные повторно из-за сдвига страниц, отбрасываются по id.
+        """
+        period_parameters = ""
         if period:
             if period[0]:
-                url += self._get_start_period_parameters(period[0])
+                period_parameters += self._get_start_period_parameters(period[0])
             if period[1]:
-                url += self._get_end_period_parameters(period[1])
-        subscriptions = self.session.get(url).json().get("itemList")
-        subscriptions = list(filter(lambda item: item["lessonQuantity"] > 1 and item["endDate"], subscriptions))
-
-        if filter_by_end_date and period:
-            subscriptions = self._filter_subscriptions_by_end_date(subscriptions, period)
+                period_parameters += self._get_end_period_parameters(period[1])
+
+        page = 1
+        page_size = page_size or self.subscriptions_page_size
+        max_page_size = self.SUBSCRIPTIONS_MAX_PAGE_SIZE
+        received = 0
+        received_ids = set()
+        while True:
+            url = self.STUDENT_SUBSCRIPTIONS_URL_TEMPLATE.format(student_id=student_id, page=page, size=page_size)
+            response = self._get_json(url + period_parameters)
+            items = response.get("itemList") or []
+
+            for item in items:
+                if item.get("id") is not None:
+                    if item["id"] in received_ids:
+                        continue
+                    received_ids.add(item["id"])
+                received += 1
+                if item["lessonQuantity"] > 1 and item["endDate"]:
+                    yield item
+
+            if self._is_last_subscriptions_page(response, page, page_size, received):
+                return
+
+            if len(items) < page_size:
+                # Сервер отсчитывает страницы по len(items) абонементов: следующая запрошенная страница
+                # начинается не позже первого еще не полученного абонемента
+                page_size = max_page_size = len(items)
+                page = received // page_size + 1
+            # Начиная со второй страницы выполнено received == page_size * (page - 1) + page_size == 2 * page_size,
+            # поэтому удвоенная страница с тем же номером продолжает список без пропусков и повторов
+            elif page > 1 and page_size * 2 <= max_page_size:
+                page_size *= 2
+            else:
+                page += 1
+
+    def _get_student_subscriptions(self, student_id: str, period: tuple[date | None, date | None] = None) -> list:
+        return list(self._iter_student_subscriptions(student_id, period))
+
+    def _get_recent_attendees(self, since: date) -> set:
+        """id учеников, которые были записаны на занятия начиная с since"""
+        period = (since, date.today())
+        return self._load_attendance_store(period).get_student_ids(period)
+
+    def _load_attendance_store(self, period: tuple[date, date],
+                               kinds: tuple = AttendanceStore.KINDS) -> AttendanceStore:
+        """Добавляет в колоночное хранилище занятия периода, которых в нем еще нет, и возвращает хранилище
+
+        Разбивки и занятия загружаются только за недостающие дни и после добавления в хранилище забываются.
+        """
+        with self._attendance_store_lock:
+            for kind in kinds:
+                missing_days = self.attendance_store.missing_days(kind, period)
+                if not missing_days:
+                    continue
+
+                missing_period = (missing_days[0], missing_days[-1])
+                if kind == "group":
+                    attendances = self.group_attendances.load(missing_period)
+                else:
+                    attendances = {day: breakdowns["individual"]
+                                   for day, breakdowns in self.breakdowns.scan(missing_period, ("individual",)).items()}
+                for day in missing_days:
+                    self.attendance_store.append(kind, day, attendances[day])
+
+            self.breakdowns.clear()
+            self.group_attendances.clear()
+            return self.attendance_store
+
+    def save_attendance_store(self) -> None:
+        """Сохраняет на диск занятия за дни, которые уже не изменятся"""
+        self.attendance_store.save()
+
+    def _get_known_end_dates(self) -> dict:
+        """Даты окончания последних абонементов учеников из снимка (загружаются один раз за запуск)
+
+        Ученики, которые были на занятиях после прошлой синхронизации, считаются неизвестными: они могли
+        купить новый абонемент. Если пора выполнить полную синхронизацию, неизвестны все ученики.
+        """
+        if not self.snapshot:
+            return dict()
+
+        with self._snapshot_lock:
+            if self._known_end_dates is None:
+                known_end_dates = dict()
+                if not self.snapshot.is_full_sync_due():
+                    known_end_dates = self.snapshot.get_last_end_dates()
+                    for student_id in self._get_recent_attendees(date.fromtimestamp(self.snapshot.last_sync)):
+                        known_end_dates.pop(student_id, None)
+                self._known_end_dates = known_end_dates
+            return self._known_end_dates
+
+    def _imap_report_students(self, func: Callable, since: date) -> Iterator:
+        """Применяет func к ученикам, которые могут попасть в отчеты по абонементам, и отдает результаты
+
+        Строку в таких отчетах дает только ученик с абонементом, который заканчивается не раньше since.
+        Если по снимку последний абонемент ученика закончился раньше since, вместо всех его абонементов
+        запрашивается один абонемент начиная с since: ученик мог купить новый после прошлого запуска.
+        Для ученика без такого абонемента func не вызывается и отдается None. Отбор выполняется в том же
+        проходе _imap_students, что и func, поэтому строки отдаются по мере готовности.
+        """
+        students = self._get_students()
+        known_end_dates = self._get_known_end_dates()
+        if not self.prune_students:
+            return self._imap_students(func, students)
 
-        return subscriptions
+        pruned_ids = {
+            student_id for student_id, last_end_date in known_end_dates.items()
+            if student_id not in self._subscriptions_indexes and (last_end_date is None or last_end_date < since)
+        }
+        logger.info(f"Candidate selection since {since}: {len(pruned_ids)} of {len(students)} students "
+                    f"checked with a one-subscription request")
+
+        def apply(student):
+            if student["id"] in pruned_ids and not self._is_student_subscribed_since(student["id"], since):
+                return None
+            return func(student)
+
+        return self._imap_students(apply, students)
+
+    def save_snapshot(self) -> None:
+        """Сохраняет в снимок даты окончания по абонементам, загруженным в этом запуске"""
+        with self._snapshot_lock:
+            # Пока отбор кандидатов не выполнялся, абонементы неизвестных учеников не загружены. Отчеты
+            # по пробным занятиям индексы абонементов не загружают - сохранять нечего
+            if not self.snapshot or self._known_end_dates is None or not self._subscriptions_indexes:
+                return
+
+            student_ids = [student["id"] for student in self._get_students()]
+            subscriptions = {student_id: subscriptions_index.all()
+                             for student_id, subscriptions_index in self._subscriptions_indexes.items()}
+            full_sync = not self._known_end_dates and all(student_id in subscriptions for student_id in student_ids)
+            self.snapshot.save(student_ids, subscriptions, full=full_sync)
+
+    def _get_student_subscriptions_index(self, student_id: str) -> SubscriptionsIndex:
+        subscriptions_index = self._subscriptions_indexes.get(student_id)
+        if subscriptions_index is None:
+            subscriptions_index = SubscriptionsIndex(self._get_student_subscriptions(student_id))
+            self._subscriptions_indexes[student_id] = subscriptions_index
+        return subscriptions_index
+
+    def _is_student_subscribed_since(self, student_id: str, start_date: date) -> bool:
+        subscriptions_index = self._subscriptions_indexes.get(student_id)
+        if subscriptions_index is not None:
+            return bool(subscriptions_index.active_in((start_date, None)))
+
+        key = (student_id, start_date)
+        with self._run_data_lock:
+            is_subscribed = self._subscribed_since.get(key)
+            unsubscribed_since = self._unsubscribed_since.get(student_id)
+        if is_subscribed is None and unsubscribed_since is not None and unsubscribed_since <= start_date:
+            return False
+
+        if is_subscribed is None:
+            # Индекс еще не загружен - достаточно первого абонемента, остальные страницы не запрашиваются
+            is_subscribed = next(self._iter_student_subscriptions(student_id, (start_date, None), page_size=1),
+                                 None) is not None
+            with self._run_data_lock:
+                self._subscribed_since[key] = is_subscribed
+                if not is_subscribed:
+                    self._unsubscribed_since[student_id] = min(self._unsubscribed_since.get(student_id, start_date),
+                                                               start_date)
+        return is_subscribed
+
+    def prefetch(self, datasets: list) -> None:
+        """Заранее загружает данные, нужные отчетам: каждый набор данных скачивается один раз
+
+        datasets - список пар (набор данных, период): ("subscriptions", дата), ("group_attendances", период),
+        ("individual_breakdowns", период). Для абонементов вместо периода указывается дата, начиная с которой
+        отчетам нужны абонементы (см. _imap_report_students)
+        """
+        breakdown_kinds = {"group_attendances": "group", "individual_breakdowns": "individual"}
+        periods = dict()
+        for dataset, period in datasets:
+            if dataset in breakdown_kinds:
+                periods.setdefault(period, set()).add(breakdown_kinds[dataset])
+
+        for period, kinds in periods.items():
+            self._load_attendance_store(period, tuple(sorted(kinds)))
+
+        subscriptions_since = [since for dataset, since in datasets if dataset == "subscriptions"]
+        if subscriptions_since:
+            for _ in self._imap_report_students(lambda student: self._get_student_subscriptions_index(student["id"]),
+                                                min(subscriptions_since)):
+                pass
+
+        logger.info(f"Prefetched datasets: {', '.join(sorted({dataset for dataset, _ in datasets}))}")
 
     def _get_group_info(self, group_id):
-        return self.session.get(self.GROUP_INFO_URL_TEMPLATE.format(group_id=group_id)).json().get("group")
-
-    def _filter_subscriptions_by_end_date(self, subscriptions: list, period: tuple[date | None, date | None]) -> list:
-        if period[0] and period[1]:
-            return list(filter(
-                lambda item: period[0] <= self._convert_subs_end_date_to_date(item["endDate"]) <= period[1],
-                subscriptions
-            ))
-        if period[0]:
-            return list(filter(
-                lambda item: period[0] <= self._convert_subs_end_date_to_date(item["endDate"]),
-                subscriptions
-            ))
-        if period[1]:
-            return list(filter(
-                lambda item: self._convert_subs_end_date_to_date(item["endDate"]) <= period[1],
-                subscriptions
-            ))
-
-    def _is_student_has_non_renewed_subs_in_month(self, student) -> tuple[bool, str | None]:
-        previous_period_subs = self._get_student_subscriptions(student["id"], self.previous_month_period)
+        return self._get_json(self.GROUP_INFO_URL_TEMPLATE.format(group_id=group_id), "group_info").get("group")
+
+    def _is_student_has_non_renewed_subs_in_month(self, subscriptions: SubscriptionsIndex) -> tuple[bool, str | None]:
+        previous_period_subs = subscriptions.active_in(self.previous_month_period)
         if not previous_period_subs:
             return False, None
 
-        current_period_subs = self._get_student_subscriptions(student["id"], self.current_month_period)
+        current_period_subs = subscriptions.active_in(self.current_month_period)
         if current_period_subs:
             return False, None
 
         return True, self._format_subs_end_date(previous_period_subs[0]["endDate"])
 
     def _get_attendances_ids(self, attendance_date: date) -> list:
-        attendance_list = self.session.get(
+        return parse_group_breakdown(self._get_json(
             self.ATTENDANCES_URL_TEMPLATE.format(year=attendance_date.year, month=attendance_date.month,
-                                                 day=attendance_date.day)
-        ).json()["breakdown"]["attendanceList"]
-
-        return [attendance.get("id") for attendance in attendance_list]
-
-    def _get_filtered_attendees(self, attendance) -> [list, str, str]:
-
-        attendees_list = [{"id": attendee["studentInfo"]["id"], "name": attendee["studentInfo"]["name"]} for
-                          attendee in attendance["attendeeList"] if
-                          attendee["statusId"] in [StatusesEnum.ATTENDED_TRIAL.value,
-                                                   StatusesEnum.ATTENDED_FREE_TRIAL.value]]
-
-        attendance_time = f"{attendance['dateTime']['hour']}:{str(attendance['dateTime']['minute']).zfill(2)}"
-        attendance_teachers = " ".join(
-            [teacher["teacherInfo"]["name"] for teacher in attendance["teacherList"]])
-
-        return attendees_list, attendance_time, attendance_teachers
-
-    def _get_students_attended_individual_trial(self, attendance_date: date) -> list:
-        group_list = self.session.get(self.IND_ATTENDANCES_URL_TEMPLATE.format(year=attendance_date.year,
-                                                                               month=attendance_date.month,
-                                                                               day=attendance_date.day)).json()[
-            "groupList"]
-        students_attended_trial_and_has_subscription = []
-
-        for group in group_list:
-            for attendance in group.get("attendanceList", []):
-                # Получаем учеников только с нужным статусом
-                attendees_list, attendance_time, attendance_teachers = self._get_filtered_attendees(attendance)
-
-                # Проверка наличия подписки у студента
-                students_attended_trial_and_has_subscription += self._get_row_data_for_student_attended_trial(
-                    attendees_list, attendance_date, attendance_time, attendance_teachers)
-
-        return students_attended_trial_and_has_subscription
-
-    def _get_students_attended_group_trial(self, attendance_date: date) -> list:
-        attendances_ids = self._get_attendances_ids(attendance_date)
-        students_attended_trial_and_has_subscription = []
-
-        # Перебор всех занятий для поиска учеников
-        for attendance_id in attendances_ids:
-            attendance = self.session.get(
-                self.ATTENDANCES_FOR_SCREEN_URL_TEMPLATE.format(attendance_id=attendance_id)).json()["attendance"]
-
-            # Получаем учеников только с нужным статусом
-            attendees_list, attendance_time, attendance_teachers = self._get_filtered_attendees(attendance)
-
-            # Проверка наличия подписки у студента
-            students_attended_trial_and_has_subscription += self._get_row_data_for_student_attended_trial(
-                attendees_list, attendance_date, attendance_time, attendance_teachers)
-
-        return students_attended_trial_and_has_subscription
-
-    def _get_row_data_for_student_attended_trial(self, attendees_list: list, attendance_date: date,
-                                                 attendance_time: str, attendance_teachers: str) -> list:
-        students_attended_trial_and_has_subscription = []
-        for attendee in attendees_list:
-            subscriptions = self._get_student_subscriptions(attendee["id"], (attendance_date, None))
-            is_subscribed = "Куплен" if len(subscriptions) else "Не куплен"
-
-            students_attended_trial_and_has_subscription.append(
-                {
-                    "name": attendee["name"],
-                    "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=attendee["id"]),
-                    "date": f"{attendance_date} {attendance_time}",
-                    "is_subscribed": is_subscribed,
-                    "teachers": attendance_teachers
-                }
-            )
-            logger.info(f"Student {attendee['id']} processed")
-        return students_attended_trial_and_has_subscription
+                                                 day=attendance_date.day, access_types=self.breakdown_access_types),
+            "group_attendances", attendance_date
+        ))
+
+    def _get_attendance(self, attendance_id: str, attendance_date: date) -> Attendance:
+        return parse_attendance(self._get_json(
+            self.ATTENDANCES_FOR_SCREEN_URL_TEMPLATE.format(attendance_id=attendance_id),
+            "attendance_for_screen", attendance_date
+        )["attendance"])
+
+    def _get_individual_attendances(self, attendance_date: date) -> list:
+        return parse_individual_breakdown(self._get_json(
+            self.IND_ATTENDANCES_URL_TEMPLATE.format(year=attendance_date.year, month=attendance_date.month,
+                                                     day=attendance_date.day, access_types=self.breakdown_access_types),
+            "individual_attendances", attendance_date
+        ))
+
+    def _get_row_data_for_student_attended_trial(self, student_id: str, student_name: str, attendance_date: date,
+                                                 attendance_time: str, attendance_teachers: str) -> dict:
+        is_subscribed = "Куплен" if self._is_student_subscribed_since(student_id, attendance_date) else "Не куплен"
+        return {
+            "name": student_name,
+            "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=student_id),
+            "date": f"{attendance_date} {attendance_time}",
+            "is_subscribed": is_subscribed,
+            "teachers": attendance_teachers
+        }
 
-    def get_students_with_non_renewed_subscription_in_month(self) -> list:
-        students_with_non_renewed_subscription = []
-        students = self._get_students()
+    def _get_student_non_renewed_row(self, student) -> dict | None:
+        subscriptions = self._get_student_subscriptions_index(student["id"])
+        _, subs_end_date = self._is_student_has_non_renewed_subs_in_month(subscriptions)
+        if not subs_end_date:
+            return None
 
-        for student in students:
-            _, subs_end_date = self._is_student_has_non_renewed_subs_in_month(student)
-            if not subs_end_date:
-                continue
+        group = self.groups.get(subscriptions.all()[0]["groupList"][0]["id"])
+        return {
+            "name": student["name"],
+            "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=student["id"]),
+            "subs_end_date": subs_end_date,
+            "type": group["type"],
+            "teacher": group["teacher"]
+        }
 
-            group_info = self._get_group_info(self._get_student_subscriptions(student["id"])[0]["groupList"][0]["id"])
-            students_with_non_renewed_subscription.append(
-                {
-                    "name": student["name"],
-                    "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=student["id"]),
-                    "subs_end_date": subs_end_date,
-                    "type": group_info.get("type"),
-                    "teacher": group_info["teacherList"][0]["name"] if group_info["teacherList"] else "-"
-                }
-            )
-            logger.info(f"Student {student['id']} processed")
+    def iter_students_with_non_renewed_subscription_in_month(self) -> Iterator[dict]:
+        for row in self._imap_report_students(self._get_student_non_renewed_row, self.previous_month_period[0]):
+            if row:
+                yield row
 
-        return students_with_non_renewed_subscription
+    def get_students_with_non_renewed_subscription_in_month(self) -> list:
+        return list(self.iter_students_with_non_renewed_subscription_in_month())
+
+    def _get_student_week_subscriptions_row(self, student) -> tuple[bool, dict] | None:
+        """Возвращает (продлил ли абонемент, строка отчета) или None, если абонемент не заканчивается на неделе"""
+        subscriptions = self._get_student_subscriptions_index(student["id"])
+        current_week_subscriptions = subscriptions.ending_in(self.current_week_period)
+        if not current_week_subscriptions:
+            return None
+
+        after_current_week_subscriptions = subscriptions.ending_in(self.after_current_week_period)
+        is_renewed = bool(after_current_week_subscriptions)
+        subscription = after_current_week_subscriptions[0] if is_renewed else current_week_subscriptions[0]
+
+        group = self.groups.get(subscription["groupList"][0]["id"])
+        return is_renewed, {
+            "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=student["id"]),
+            "type": group["type"],
+            "teacher": group["teacher"]
+        }
 
     def get_students_week_subscriptions_info(self) -> dict:
         students_ids_who_have_non_renewed_subscription = []
         students_ids_who_renewed_subscription = []
-        students = self._get_students()
-
-        for student in students:
-
-            current_week_subscriptions = self._get_student_subscriptions(student["id"], self.current_week_period,
-                                                                         filter_by_end_date=True)
-            if current_week_subscriptions:
-
-                after_current_week_subscriptions = self._get_student_subscriptions(student["id"],
-                                                                                   self.after_current_week_period,
-                                                                                   filter_by_end_date=True)
-                if after_current_week_subscriptions:
-
-                    group_info = self._get_group_info(after_current_week_subscriptions[0]["groupList"][0]["id"])
-                    students_ids_who_renewed_subscription.append({
-                        "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=student["id"]),
-                        "type": group_info.get("type"),
-                        "teacher": group_info["teacherList"][0]["name"] if group_info["teacherList"] else "-"
-                    })
-
-                else:
-                    group_info = self._get_group_info(current_week_subscriptions[0]["groupList"][0]["id"])
-                    students_ids_who_have_non_renewed_subscription.append({
-                        "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=student["id"]),
-                        "type": group_info.get("type"),
-                        "teacher": group_info["teacherList"][0]["name"] if group_info["teacherList"] else "-"
-                    })
+        for result in self._imap_report_students(self._get_student_week_subscriptions_row,
+                                                 self.current_week_period[0]):
+            if not result:
+                continue
 
-                logger.info(f"Student {student['id']} processed")
+            is_renewed, row = result
+            if is_renewed:
+                students_ids_who_renewed_subscription.append(row)
+            else:
+                students_ids_who_have_non_renewed_subscription.append(row)
 
         return {
             "have_non_renewed_subscription": students_ids_who_have_non_renewed_subscription,
             "who_renewed_subscription": students_ids_who_renewed_subscription
         }
 
-    def get_students_with_ending_subscription_in_next_month(self) -> list:
-        students_with_ending_subscription_in_next_month = []
-        students = self._get_students()
-
-        for student in students:
-            subscriptions_ending_in_next_month = self._get_student_subscriptions(
-                student["id"],
-                self._get_month_period("next"),
-                filter_by_end_date=True
-            )
+    def _get_student_ending_subscriptions_rows(self, student) -> list:
+        subscriptions_ending_in_next_month = self._get_student_subscriptions_index(student["id"]).ending_in(
+            self.next_month_period
+        )
 
-            for subscription in subscriptions_ending_in_next_month:
-                students_with_ending_subscription_in_next_month.append({
-                    "name": student["name"],
-                    "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=student["id"]),
-                    "subs_end_date": self._format_subs_end_date(subscription["endDate"]),
-                    "total_price": subscription["totalPrice"]
-                })
+        rows = []
+        for subscription in subscriptions_ending_in_next_month:
+            rows.append({
+                "name": student["name"],
+                "link": self.STUDENT_CARD_URL_TEMPLATE.format(student_id=student["id"]),
+                "subs_end_date": self._format_subs_end_date(subscription["endDate"]),
+                "total_price": subscription["totalPrice"]
+            })
 
-                logger.info(f"Student {student['id']} processed")
+        return rows
 
-        return students_with_ending_subscription_in_next_month
+    def iter_students_with_ending_subscription_in_next_month(self) -> Iterator[dict]:
+        for rows in self._imap_report_students(self._get_student_ending_subscriptions_rows, self.next_month_period[0]):
+            yield from rows or []
 
-    def get_students_attended_trial(self, period: tuple[date, date]) -> list:
-
-        start_date, end_date = period
-        students_attended_trial_and_has_subscription = []
+    def get_students_with_ending_subscription_in_next_month(self) -> list:
+        return list(self.iter_students_with_ending_subscription_in_next_month())
 
-        # Перебор всех дней для сбора занятий
-        current_date = start_date
-        while current_date <= end_date:
-            students_attended_trial_and_has_subscription += self._get_students_attended_group_trial(current_date)
-            students_attended_trial_and_has_subscription += self._get_students_attended_individual_trial(current_date)
+    def _get_trial_attendees(self, period: tuple[date, date]) -> list:
+        """Ученики на пробных занятиях периода: [(дата, время занятия, id ученика, имя ученика, преподаватели), ...]"""
+        return self._load_attendance_store(period).get_attendees(period, self.TRIAL_STATUSES)
 
-            current_date += timedelta(days=1)
+    def iter_students_attended_trial(self, period: tuple[date, date]) -> Iterator[dict]:
+        # Проверки абонементов выполняются в потоках _imap_students, строки отдаются в порядке занятий
+        yield from self._imap_students(
+            lambda attendee: self._get_row_data_for_student_attended_trial(attendee[2], attendee[3], attendee[0],
+                                                                           attendee[1], " ".join(attendee[4])),
+            self._get_trial_attendees(period)
+        )
 
-        return students_attended_trial_and_has_subscription
+    def get_students_attended_trial(self, period: tuple[date, date]) -> list:
+        return list(self.iter_students_attended_trial(period))
 
     def get_teachers_attendances_group_stats(self, period: tuple[date, date]) -> dict:
-        start_date, end_date = period
-        teachers_attendances_stats = TeachersAttendancesStats()
-
-        # Перебор всех дней для сбора занятий
-        current_date = start_date
-        while current_date <= end_date:
-            attendances_ids = self._get_attendances_ids(current_date)
-            for attendance_id in attendances_ids:
-                attendance = self.session.get(self.ATTENDANCES_FOR_SCREEN_URL_TEMPLATE.format(
-                    attendance_id=attendance_id)
-                ).json()["attendance"]
-                teachers_attendances_stats.add_teacher_attendance_stats(attendance)
-
-            current_date += timedelta(days=1)
-
-        return teachers_attendances_stats.get_stats()
+        return self._load_attendance_store(period, ("group",)).get_teachers_stats(period, "group").get_stats()
 
     def get_teachers_attendances_individual_stats(self, period: tuple[date, date]) -> dict:
-        start_date, end_date = period
-        teachers_attendances_stats = TeachersAttendancesStats()
-
-        # Перебор всех дней для сбора занятий
-        current_date = start_date
-        while current_date <= end_date:
-            group_list = self.session.get(self.IND_ATTENDANCES_URL_TEMPLATE.format(
-                year=current_date.year,
-                month=current_date.month,
-                day=current_date.day)).json()["groupList"]
-            for group in group_list:
-                for attendance in group.get("attendanceList", []):
-                    teachers_attendances_stats.add_teacher_attendance_stats(attendance)
-
-            current_date += timedelta(days=1)
-
-        return teachers_attendances_stats.get_stats()
+        return self._load_attendance_store(period, ("individual",)).get_teachers_stats(period, "individual").get_stats()
+
+    def get_trial_conversion_stats(self, period: tuple[date, date]) -> dict:
+        """Конверсия пробных занятий в покупку абонемента по первому преподавателю занятия:
+        {преподаватель: {"trials": пробных занятий, "purchased": из них купили абонемент, "conversion": %}}"""
+        trial_attendees = self._get_trial_attendees(period)
+        purchased = self._map_students(
+            lambda attendee: self._is_student_subscribed_since(attendee[2], attendee[0]), trial_attendees
+        )
+        teachers = [attendee[4][0] if attendee[4] else "-" for attendee in trial_attendees]
+
+        trials_count = Counter(teachers)
+        purchased_count = Counter(compress(teachers, purchased))
+        return {
+            teacher: {
+                "trials": trials,
+                "purchased": purchased_count[teacher],
+                "conversion": round(100 * purchased_count[teacher] / trials, 1),
+            }
+            for teacher, trials in trials_count.items()
+        }
 
-    def create_excel_file_students_with_non_renewed_subscription_in_month(self, filename) -> None:
+    def get_weekday_load(self, period: tuple[date, date]) -> list:
+        """Количество занятий и учеников по дням недели (понедельник - 0)"""
+        return self._load_attendance_store(period).get_weekday_load(period)
 
-        students = self.get_students_with_non_renewed_subscription_in_month()
+    @contextmanager
+    def _write_report(self, filename: str) -> Iterator[ReportWriter]:
+        """Писатель отчета по расширению файла. Время записи учитывается в метриках как этап write"""
+        writer = create_report_writer(filename)
+        try:
+            yield writer
+        finally:
+            writer.close()
+            self.metrics.add_phase_duration("write", writer.write_time)
 
-        wb = openpyxl.Workbook()
-        ws = wb.worksheets[0]
+    # Методы create_* возвращают итоги отчета для хранилища трендов: {ключ: {показатель: значение}},
+    # итоги по всем ученикам записываются с пустым ключом
 
-        ws["A1"] = "Имя ученика"
-        ws["B1"] = "Дата окончания абонемента"
-        ws["C1"] = "Ссылка на карточку ученика"
-        ws["D1"] = "Статус занятия"
-        ws["E1"] = "Преподаватель"
+    def create_excel_file_students_with_non_renewed_subscription_in_month(self, filename) -> dict:
 
-        for row_index, student in enumerate(students, start=2):
-            ws[f"A{row_index}"] = student["name"]
-            ws[f"B{row_index}"] = student["subs_end_date"]
-            ws[f"C{row_index}"] = student["link"]
-            ws[f"D{row_index}"] = student["type"]
-            ws[f"E{row_index}"] = student["teacher"]
+        with self._write_report(filename) as writer:
+            writer.start_sheet(None, ["Имя ученика", "Дата окончания абонемента", "Ссылка на карточку ученика",
+                                      "Статус занятия", "Преподаватель"])
+            for student in self.iter_students_with_non_renewed_subscription_in_month():
+                writer.write_row([student["name"], student["subs_end_date"], student["link"], student["type"],
+                                  student["teacher"]])
 
-        wb.save(filename=filename)
         logger.info("Excel file with non-renewed subs in month was created")
+        return {"": {"students": writer.rows_count}}
 
-    def create_excel_file_with_students_week_subscriptions_info(self, filename) -> None:
+    def create_excel_file_with_students_week_subscriptions_info(self, filename) -> dict:
 
         subs_info = self.get_students_week_subscriptions_info()
+        non_renewed = subs_info["have_non_renewed_subscription"]
+        renewed = subs_info["who_renewed_subscription"]
+
+        with self._write_report(filename) as writer:
+            writer.start_sheet(None, ["Всего", "Непродлившие", "Статус занятия", "Преподаватель", "Продлившие",
+                                      "Статус занятия", "Преподаватель"])
+            writer.write_row([f"{len(non_renewed) + len(renewed)}", f"{len(non_renewed)}", None, None,
+                              f"{len(renewed)}", None, None])
+
+            # Непродлившие и продлившие выводятся параллельными столбцами
+            for non_renewed_student, renewed_student in zip_longest(non_renewed, renewed):
+                row = [None] * 7
+                if non_renewed_student:
+                    row[1:4] = [non_renewed_student["link"], non_renewed_student["type"],
+                                non_renewed_student["teacher"]]
+                if renewed_student:
+                    row[4:7] = [renewed_student["link"], renewed_student["type"], renewed_student["teacher"]]
+                writer.write_row(row)
 
-        wb = openpyxl.Workbook()
-        ws = wb.worksheets[0]
-
-        ws["A1"] = "Всего"
-        ws["A2"] = f"{len(subs_info["have_non_renewed_subscription"]) + len(subs_info["who_renewed_subscription"])}"
-        ws["B1"] = "Непродлившие"
-        ws["B2"] = f"{len(subs_info["have_non_renewed_subscription"])}"
-        ws["C1"] = "Статус занятия"
-        ws["D1"] = "Преподаватель"
-        ws["E1"] = "Продлившие"
-        ws["E2"] = f"{len(subs_info["who_renewed_subscription"])}"
-        ws["F1"] = "Статус занятия"
-        ws["G1"] = "Преподаватель"
-
-        for row_index, student_link in enumerate(subs_info["have_non_renewed_subscription"], start=3):
-            ws[f"B{row_index}"] = student_link["link"]
-            ws[f"C{row_index}"] = student_link["type"]
-            ws[f"D{row_index}"] = student_link["teacher"]
-
-        for row_index, student_link in enumerate(subs_info["who_renewed_subscription"], start=3):
-            ws[f"E{row_index}"] = student_link["link"]
-            ws[f"F{row_index}"] = student_link["type"]
-            ws[f"G{row_index}"] = student_link["teacher"]
-
-        wb.save(filename=filename)
         logger.info("Excel file with students week subs info was created")
+        return {"": {"total": len(non_renewed) + len(renewed), "non_renewed": len(non_renewed),
+                     "renewed": len(renewed)}}
 
-    def create_excel_students_with_ending_subscription_in_next_month(self, filename: str) -> None:
-
-        students = self.get_students_with_ending_subscription_in_next_month()
+    def create_excel_students_with_ending_subscription_in_next_month(self, filename: str) -> dict:
+        total_price = 0
 
-        wb = openpyxl.Workbook()
-        ws = wb.worksheets[0]
+        with self._write_report(filename) as writer:
+            writer.start_sheet(None, ["Имя", "Сумма", "Дата окончания абонемента", "Ссылка на карточку ученика"])
+            for student in self.iter_students_with_ending_subscription_in_next_month():
+                writer.write_row([student["name"], student["total_price"], student["subs_end_date"], student["link"]])
+                if isinstance(student["total_price"], (int, float)):
+                    total_price += student["total_price"]
 
-        ws["A1"] = "Имя"
-        ws["B1"] = "Сумма"
-        ws["C1"] = "Дата окончания абонемента"
-        ws["D1"] = "Ссылка на карточку ученика"
-
-        for row_index, student in enumerate(students, start=2):
-            ws[f"A{row_index}"] = student["name"]
-            ws[f"B{row_index}"] = student["total_price"]
-            ws[f"C{row_index}"] = student["subs_end_date"]
-            ws[f"D{row_index}"] = student["link"]
-
-        wb.save(filename=filename)
         logger.info("Excel file with students ending subs in next month was created")
+        return {"": {"students": writer.rows_count, "total_price": total_price}}
 
-    def create_excel_students_attended_trial(self, filename: str, period: tuple[date, date]) -> None:
-
-        students = self.get_students_attended_trial(period)
+    def create_excel_students_attended_trial(self, filename: str, period: tuple[date, date]) -> dict:
+        purchased = 0
 
-        wb = openpyxl.Workbook()
-        ws = wb.worksheets[0]
+        with self._write_report(filename) as writer:
+            writer.start_sheet(None, ["Имя ученика", "Ссылка на карточку ученика", "Дата пробного занятия",
+                                      "Статус абонемента", "Педагог"])
+            for student in self.iter_students_attended_trial(period):
+                writer.write_row([student["name"], student["link"], student["date"], student["is_subscribed"],
+                                  student["teachers"]])
+                purchased += student["is_subscribed"] == "Куплен"
 
-        ws["A1"] = "Имя ученика"
-        ws["B1"] = "Ссылка на карточку ученика"
-        ws["C1"] = "Дата пробного занятия"
-        ws["D1"] = "Статус абонемента"
-        ws["E1"] = "Педагог"
-
-        for row_index, student in enumerate(students, start=2):
-            ws[f"A{row_index}"] = student["name"]
-            ws[f"B{row_index}"] = student["link"]
-            ws[f"C{row_index}"] = student["date"]
-            ws[f"D{row_index}"] = student["is_subscribed"]
-            ws[f"E{row_index}"] = student["teachers"]
-
-        wb.save(filename=filename)
         logger.info("Excel file with students attended trial was created")
+        trials = writer.rows_count
+        return {"": {"trials": trials, "purchased": purchased,
+                     "conversion": round(100 * purchased / trials, 1) if trials else None}}
 
-    def create_excel_teachers_attendances_stats(self, filename: str, period: tuple[date, date]) -> None:
+    def create_excel_teachers_attendances_stats(self, filename: str, period: tuple[date, date]) -> dict:
         group_stats = self.get_teachers_attendances_group_stats(period)
         ind_stats = self.get_teachers_attendances_individual_stats(period)
 
-        def _create_head(work_sheet):
-            work_sheet["A1"] = "Педагог"
-            work_sheet["B1"] = "Посетил(а)"
-            work_sheet["C1"] = "Отработал(а)"
-            work_sheet["D1"] = "Пропустил(а)"
-            work_sheet["E1"] = "Посетил(а) платное пробное"
-            work_sheet["F1"] = "Сумма"
-            work_sheet["G1"] = "Количество проведенных занятий"
+        headers = ["Педагог", "Посетил(а)", "Отработал(а)", "Пропустил(а)", "Посетил(а) платное пробное", "Сумма",
+                   "Количество проведенных занятий"]
 
-        def _fill_data(work_sheet, data):
+        def _fill_data(writer, data):
             for row_index, (teacher, teacher_stats) in enumerate(data, start=2):
-                work_sheet[f"A{row_index}"] = teacher
-                work_sheet[f"B{row_index}"] = teacher_stats["statuses"]["ATTEND"]
-                work_sheet[f"C{row_index}"] = teacher_stats["statuses"]["WORKED_OUT"]
-                work_sheet[f"D{row_index}"] = teacher_stats["statuses"]["SKIP"]
-                work_sheet[f"E{row_index}"] = teacher_stats["statuses"]["ATTENDED_TRIAL"]
-                work_sheet[f"F{row_index}"] = f"=SUM(B{row_index}:E{row_index})"
-                work_sheet[f"G{row_index}"] = teacher_stats["attendances_count"]
-
-        wb = openpyxl.Workbook()
-        ws_group = wb.active
-        ws_group.title = "Групповые"
-        ws_ind = wb.create_sheet("Индивидуальные")
-
-        _create_head(ws_group)
-        _create_head(ws_ind)
-
-        _fill_data(ws_group, group_stats.items())
-        _fill_data(ws_ind, ind_stats.items())
-
-        wb.save(filename=filename)
+                statuses = [teacher_stats["statuses"]["ATTEND"], teacher_stats["statuses"]["WORKED_OUT"],
+                            teacher_stats["statuses"]["SKIP"], teacher_stats["statuses"]["ATTENDED_TRIAL"]]
+                total = f"=SUM(B{row_index}:E{row_index})" if writer.supports_formulas else sum(statuses)
+                writer.write_row([teacher, *statuses, total, teacher_stats["attendances_count"]])
+
+        with self._write_report(filename) as writer:
+            writer.start_sheet("Групповые", headers)
+            _fill_data(writer, group_stats.items())
+            writer.start_sheet("Индивидуальные", headers)
+            _fill_data(writer, ind_stats.items())
+
         logger.info("Excel file with teachers attendances stats was created")
+        summary = dict()
+        for kind, stats in (("group", group_stats), ("individual", ind_stats)):
+            for teacher, teacher_stats in stats.items():
+                teacher_summary = summary.setdefault(teacher, dict())
+                for status, count in teacher_stats["statuses"].items():
+                    teacher_summary[f"{kind}.{status}"] = count
+                teacher_summary[f"{kind}.attendances_count"] = teacher_stats["attendances_count"]
+        return summary
+
+    def create_excel_attendance_analytics(self, filename: str, period: tuple[date, date]) -> dict:
+        conversion_stats = self.get_trial_conversion_stats(period)
+        weekday_load = self.get_weekday_load(period)
+
+        with self._write_report(filename) as writer:
+            writer.start_sheet("Конверсия пробных", ["Педагог", "Пробных занятий", "Купили абонемент", "Конверсия, %"])
+            for teacher, teacher_stats in conversion_stats.items():
+                writer.write_row([teacher, teacher_stats["trials"], teacher_stats["purchased"],
+                                  teacher_stats["conversion"]])
+
+            writer.start_sheet("Загрузка по дням недели", ["День недели", "Занятий", "Учеников"])
+            for weekday_stats in weekday_load:
+                writer.write_row([self.WEEKDAY_NAMES[weekday_stats["weekday"]], weekday_stats["lessons"],
+                                  weekday_stats["attendees"]])
+
+        logger.info("Excel file with attendance analytics was created")
+        return {
+            **conversion_stats,
+            **{self.WEEKDAY_NAMES[weekday_stats["weekday"]]: {"lessons": weekday_stats["lessons"],
+                                                            "attendees": weekday_stats["attendees"]}
+               for weekday_stats in weekday_load},
+        }
 
 
 def test():
@@ -534,9 +862,309 @@ def test():
     pprint(paraplan.get_teachers_attendances_individual_stats(paraplan.current_month_period))
 
 
+def _get_cli_option(name: str, default: str | None = None) -> str | None:
+    """Возвращает значение опции вида `--name value` или `--name=value` из аргументов командной строки"""
+    for index, arg in enumerate(sys.argv[2:], start=2):
+        if arg == name and index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+        if arg.startswith(f"{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+def _get_int_cli_option(name: str, default: int, minimum: int = 0) -> int:
+    value = _get_cli_option(name, str(default))
+    if not value.isdigit() or int(value) < minimum:
+        raise CliArgumentError(f"Значение опции {name} должно быть целым числом не меньше {minimum}")
+    return int(value)
+
+
+def _get_date_cli_option(name: str, default: date | None = None) -> date | None:
+    value = _get_cli_option(name)
+    if value is None:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CliArgumentError(f"Значение опции {name} должно быть датой в формате ГГГГ-ММ-ДД")
+
+
+def _get_report_period_cli_option() -> tuple[date, date] | None:
+    """Период отчетов из опций --from и --to (по умолчанию до сегодняшнего дня) или None, если период не задан"""
+    start_date = _get_date_cli_option("--from")
+    end_date = _get_date_cli_option("--to", date.today())
+    if start_date is None:
+        if _get_cli_option("--to"):
+            raise CliArgumentError("Опция --to используется только вместе с --from")
+        return None
+
+    if end_date < start_date:
+        raise CliArgumentError("Дата --to должна быть не раньше даты --from")
+    return start_date, end_date
+
+
+REPORT_FORMATS = [extension.lstrip(".") for extension in REPORT_WRITERS]
+
+REPORTS = {
+    "current-month": {
+        "filename": "students-month.xlsx",
+        "create": lambda paraplan, filename:
+            paraplan.create_excel_file_students_with_non_renewed_subscription_in_month(filename),
+        "period": lambda paraplan: paraplan.current_month_period,
+        "datasets": lambda paraplan: [("subscriptions", paraplan.previous_month_period[0])],
+        "data": lambda paraplan: paraplan.get_students_with_non_renewed_subscription_in_month(),
+    },
+    "current-week": {
+        "filename": "students-week-info.xlsx",
+        "create": lambda paraplan, filename: paraplan.create_excel_file_with_students_week_subscriptions_info(filename),
+        "period": lambda paraplan: paraplan.current_week_period,
+        "datasets": lambda paraplan: [("subscriptions", paraplan.current_week_period[0])],
+        "data": lambda paraplan: paraplan.get_students_week_subscriptions_info(),
+    },
+    "next-month": {
+        "filename": "students-predicts.xlsx",
+        "create": lambda paraplan, filename: paraplan.create_excel_students_with_ending_subscription_in_next_month(
+            filename),
+        "period": lambda paraplan: paraplan.next_month_period,
+        "datasets": lambda paraplan: [("subscriptions", paraplan.next_month_period[0])],
+        "data": lambda paraplan: paraplan.get_students_with_ending_subscription_in_next_month(),
+    },
+    "month-conversion-of-trial-sessions": {
+        "filename": "conversion-of-trial-sessions.xlsx",
+        "create": lambda paraplan, filename: paraplan.create_excel_students_attended_trial(
+            filename, paraplan.current_month_period),
+        "period": lambda paraplan: paraplan.current_month_period,
+        "datasets": lambda paraplan: [("group_attendances", paraplan.current_month_period),
+                                      ("individual_breakdowns", paraplan.current_month_period)],
+        "data": lambda paraplan: paraplan.get_students_attended_trial(paraplan.current_month_period),
+    },
+    "week-conversion-of-trial-sessions": {
+        "filename": "conversion-of-trial-sessions.xlsx",
+        "create": lambda paraplan, filename: paraplan.create_excel_students_attended_trial(
+            filename, paraplan.current_week_period),
+        "period": lambda paraplan: paraplan.current_week_period,
+        "datasets": lambda paraplan: [("group_attendances", paraplan.current_week_period),
+                                      ("individual_breakdowns", paraplan.current_week_period)],
+        "data": lambda paraplan: paraplan.get_students_attended_trial(paraplan.current_week_period),
+    },
+    "teachers-stats": {
+        "filename": "teacher-stats.xlsx",
+        "create": lambda paraplan, filename: paraplan.create_excel_teachers_attendances_stats(
+            filename, paraplan.current_month_period),
+        "period": lambda paraplan: paraplan.current_month_period,
+        "datasets": lambda paraplan: [("group_attendances", paraplan.current_month_period),
+                                      ("individual_breakdowns", paraplan.current_month_period)],
+        "data": lambda paraplan: {
+            "group": paraplan.get_teachers_attendances_group_stats(paraplan.current_month_period),
+            "individual": paraplan.get_teachers_attendances_individual_stats(paraplan.current_month_period),
+        },
+    },
+    "attendance-analytics": {
+        "filename": "attendance-analytics.xlsx",
+        "create": lambda paraplan, filename: paraplan.create_excel_attendance_analytics(
+            filename, paraplan.current_month_period),
+        "period": lambda paraplan: paraplan.current_month_period,
+        "datasets": lambda paraplan: [("group_attendances", paraplan.current_month_period),
+                                      ("individual_breakdowns", paraplan.current_month_period)],
+        "data": lambda paraplan: {
+            "trial_conversion": paraplan.get_trial_conversion_stats(paraplan.current_month_period),
+            "weekday_load": paraplan.get_weekday_load(paraplan.current_month_period),
+        },
+    },
+}
+
+
+def parse_actions(argument: str) -> list:
+    """Разбирает действие из командной строки: одно действие, несколько через запятую или all"""
+    if argument == "all":
+        return list(REPORTS)
+
+    actions = argument.split(",")
+    unknown_actions = [action for action in actions if action not in REPORTS]
+    if unknown_actions:
+        raise CliArgumentError(f"Неизвестные действия: {', '.join(unknown_actions)}\n"
+                               f"Используйте {' | '.join([*REPORTS, 'all'])} или несколько действий через запятую")
+    return actions
+
+
+def _create_paraplan(cache_horizon: int) -> ParaplanAPI:
+    """Создает ParaplanAPI с настройками из опций командной строки"""
+    workers = _get_int_cli_option("--workers", 1, minimum=1)
+    subscriptions_page_size = _get_int_cli_option("--page-size", 10, minimum=1)
+    rate_limit = _get_int_cli_option("--rate-limit", 0)
+    timeout = _get_int_cli_option("--timeout", 60, minimum=1)
+    retries = _get_int_cli_option("--retries", 3)
+
+    snapshot = None
+    if "--no-snapshot" not in sys.argv:
+        snapshot = StudentsSnapshot(full_sync_days=_get_int_cli_option("--full-sync-days", 7, minimum=1),
+                                    full_sync="--full-sync" in sys.argv)
+
+    session_store = None
+    if "--no-session-store" not in sys.argv:
+        session_store = SessionStore(_get_cli_option("--session-store", "session.json"))
+
+    cache = None
+    if "--no-cache" not in sys.argv:
+        cache = ResponseCache(immutable_after_days=cache_horizon, refresh="--refresh" in sys.argv)
+
+    attendance_store = AttendanceStore()
+    if "--no-attendance-store" not in sys.argv:
+        attendance_store = AttendanceStore(_get_cli_option("--attendance-store", "attendances.store"),
+                                           immutable_after_days=cache_horizon, refresh="--refresh" in sys.argv)
+
+    breakdown_access_types = ParaplanAPI.BREAKDOWN_ACCESS_TYPES
+    if _get_cli_option("--breakdown-access-types"):
+        breakdown_access_types = tuple(_get_cli_option("--breakdown-access-types").split(","))
+        unknown_access_types = set(breakdown_access_types) - set(ParaplanAPI.ALL_BREAKDOWN_ACCESS_TYPES)
+        if unknown_access_types:
+            raise CliArgumentError(f"Неизвестные типы данных разбивок: {', '.join(sorted(unknown_access_types))}\n"
+                                   f"Используйте {', '.join(ParaplanAPI.ALL_BREAKDOWN_ACCESS_TYPES)}")
+
+    trends = None
+    if "--no-trends" not in sys.argv:
+        trends = TrendStore(_get_cli_option("--trends", "trends.sqlite3"))
+
+    return ParaplanAPI(max_workers=workers, cache=cache, subscriptions_page_size=subscriptions_page_size,
+                       rate_limit=rate_limit or None, timeout=timeout, retries=retries,
+                       session_store=session_store, snapshot=snapshot,
+                       prune_students="--no-pruning" not in sys.argv, breakdown_access_types=breakdown_access_types,
+                       attendance_store=attendance_store, trends=trends)
+
+
+def prefetch_reports(paraplan: ParaplanAPI, actions: list) -> None:
+    with paraplan.metrics.phase("prefetch"):
+        paraplan.prefetch([dataset for action in actions for dataset in REPORTS[action]["datasets"](paraplan)])
+
+
+def create_report(paraplan: ParaplanAPI, action: str, filename: str) -> None:
+    """Строит отчет и сохраняет его итоги за период отчета в хранилище трендов"""
+    with paraplan.metrics.phase(action):
+        summary = REPORTS[action]["create"](paraplan, filename)
+    if paraplan.trends:
+        paraplan.trends.record(action, REPORTS[action]["period"](paraplan), summary)
+
+
+def _run_reports(paraplan: ParaplanAPI, actions: list, report_format: str) -> None:
+    from bot import send_report_to_tg
+
+    for action in actions:
+        filename = f"{os.path.splitext(REPORTS[action]['filename'])[0]}.{report_format}"
+        create_report(paraplan, action, filename)
+        with paraplan.metrics.phase("telegram"):
+            send_report_to_tg(filename)
+
+    paraplan.save_snapshot()
+    paraplan.save_attendance_store()
+
+
+def _verify_pruning(paraplan: ParaplanAPI, actions: list) -> None:
+    """Сравнивает отчеты, построенные с отбором кандидатов и по всем ученикам
+
+    Отбор влияет на отчеты по абонементам и на проверку покупки абонемента после пробного занятия
+    (конверсия, аналитика посещений), поэтому сравниваются все отчеты.
+    """
+    mismatched_actions = []
+    for action in actions:
+        paraplan.prune_students = True
+        pruned_rows = REPORTS[action]["data"](paraplan)
+        paraplan.prune_students = False
+        all_rows = REPORTS[action]["data"](paraplan)
+        paraplan.prune_students = True
+
+        if pruned_rows != all_rows:
+            mismatched_actions.append(action)
+            logger.error(f"Pruning verification failed for {action}")
+        else:
+            logger.info(f"Pruning verification passed for {action}")
+
+    paraplan.save_snapshot()
+    if mismatched_actions:
+        message = f"Отбор учеников изменил отчеты: {', '.join(mismatched_actions)}"
+    else:
+        message = "Отбор учеников не изменил отчеты"
+    logger.info(message)
+    print(message)
+
+
+def _save_metrics(paraplan: ParaplanAPI) -> None:
+    logger.info(paraplan.metrics.format_summary())
+    if _get_cli_option("--metrics-json"):
+        paraplan.metrics.write_json(_get_cli_option("--metrics-json"))
+    if _get_cli_option("--metrics-prom"):
+        paraplan.metrics.write_prometheus(_get_cli_option("--metrics-prom"))
+
+
+def _parse_daemon_schedule() -> list:
+    schedule = _get_cli_option("--schedule")
+    if not schedule:
+        raise CliArgumentError("Для режима daemon укажите расписание: --schedule \"current-week=mon 09:00\"")
+
+    entries = parse_schedule(schedule)
+    unknown_actions = [entry.action for entry in entries if entry.action not in REPORTS]
+    if not entries or unknown_actions:
+        raise CliArgumentError(f"Неизвестные действия в расписании: {', '.join(unknown_actions)}\n"
+                               f"Используйте {' | '.join(REPORTS)}")
+    return entries
+
+
+def _run_daemon(paraplan: ParaplanAPI, entries: list, report_format: str, cache_horizon: int) -> None:
+    """Строит отчеты по расписанию в одном процессе: сессия и уже загруженные данные переиспользуются"""
+    def prefetch(actions: list) -> None:
+        paraplan.refresh_periods()
+        paraplan.reset_run_data(keep_before=date.today() - timedelta(days=cache_horizon))
+        prefetch_reports(paraplan, actions)
+
+    def run(actions: list) -> None:
+        paraplan.refresh_periods()
+        try:
+            _run_reports(paraplan, actions, report_format)
+        finally:
+            _save_metrics(paraplan)
+
+    prefetch_lead = timedelta(minutes=_get_int_cli_option("--prefetch-lead", 30))
+    logger.info(f"Daemon started: {len(entries)} scheduled reports, prefetch {prefetch_lead} before run")
+    Scheduler(entries, prefetch, run, prefetch_lead).run_forever()
+
+
+def _run_server(paraplan: ParaplanAPI, cache_horizon: int) -> None:
+    """HTTP API с JSON-результатами отчетов (см. server.py)"""
+    def compute(action: str, period: tuple[date, date] | None):
+        if period:
+            paraplan.set_report_period(period)
+        else:
+            paraplan.refresh_periods()
+        data = REPORTS[action]["data"](paraplan)
+        paraplan.save_snapshot()
+        paraplan.save_attendance_store()
+        return data
+
+    def reset() -> None:
+        paraplan.reset_run_data(keep_before=date.today() - timedelta(days=cache_horizon))
+
+    service = ReportService(compute, list(REPORTS), ttl=_get_int_cli_option("--ttl", 600, minimum=1), reset=reset)
+    server = ReportsServer((_get_cli_option("--host", "127.0.0.1"), _get_int_cli_option("--port", 8000)), service)
+    logger.info(f"Reports API started: {server.base_url}")
+    print(f"Reports API: {server.base_url}")
+    server.serve_forever()
+
+
+def _run_trends_report(report_format: str) -> None:
+    """Отчет по трендам строится только по сохраненным итогам, без запросов к Paraplan"""
+    from bot import send_report_to_tg
+
+    filename = f"trends.{report_format}"
+    store = TrendStore(_get_cli_option("--trends", "trends.sqlite3"))
+    try:
+        create_trends_report(store, filename, list(REPORTS),
+                             periods_count=_get_int_cli_option("--periods", 6, minimum=2))
+    finally:
+        store.close()
+    send_report_to_tg(filename)
+
+
 def main():
-    actions_list = ["current-month", "current-week", "next-month", "month-conversion-of-trial-sessions",
-                    "week-conversion-of-trial-sessions", "teachers-stats"]
+    actions_list = [*REPORTS, "all", "daemon", "serve", "trends"]
 
     if len(sys.argv) < 2:
         message = f"Не указан тип действия\nИспользуйте {' | '.join(actions_list)}"
@@ -544,38 +1172,63 @@ def main():
         print(message)
         return
 
-    if sys.argv[1] not in actions_list:
-        message = f"Используйте {' | '.join(actions_list)}"
-        logger.error(message)
-        print(message)
+    schedule, actions = None, None
+    if sys.argv[1] == "daemon":
+        schedule = _parse_daemon_schedule()
+    elif sys.argv[1] not in ("serve", "trends"):
+        actions = parse_actions(sys.argv[1])
+
+    report_period = _get_report_period_cli_option()
+    if report_period and schedule:
+        raise CliArgumentError("В режиме daemon периоды отчетов вычисляются от даты запуска, "
+                               "опции --from и --to не поддерживаются")
+
+    report_format = _get_cli_option("--format", "xlsx")
+    if report_format not in REPORT_FORMATS:
+        raise CliArgumentError(f"Формат отчета (--format) должен быть одним из: {', '.join(REPORT_FORMATS)}")
+
+    # Настройки Telegram проверяются до построения отчетов; serve и проверка отбора ничего не отправляют
+    if sys.argv[1] != "serve" and "--verify-pruning" not in sys.argv:
+        from bot import get_bot_config
+        get_bot_config()
+
+    if sys.argv[1] == "trends":
+        _run_trends_report(report_format)
         return
 
-    paraplan = ParaplanAPI()
+    cache_horizon = _get_int_cli_option("--cache-horizon", 7)
+    paraplan = _create_paraplan(cache_horizon)
 
-    if sys.argv[1] == "teachers-stats":
-        filename = "teacher-stats.xlsx"
-        paraplan.create_excel_teachers_attendances_stats(filename, paraplan.current_month_period)
-        send_report_to_tg(filename)
-    if sys.argv[1] == "month-conversion-of-trial-sessions":
-        filename = "conversion-of-trial-sessions.xlsx"
-        paraplan.create_excel_students_attended_trial(filename, paraplan.current_month_period)
-        send_report_to_tg(filename)
-    if sys.argv[1] == "week-conversion-of-trial-sessions":
-        filename = "conversion-of-trial-sessions.xlsx"
-        paraplan.create_excel_students_attended_trial(filename, paraplan.current_week_period)
-        send_report_to_tg(filename)
-    if sys.argv[1] == "current-month":
-        filename = "students-month.xlsx"
-        paraplan.create_excel_file_students_with_non_renewed_subscription_in_month(filename)
-        send_report_to_tg(filename)
-    if sys.argv[1] == "current-week":
-        filename = "students-week-info.xlsx"
-        paraplan.create_excel_file_with_students_week_subscriptions_info(filename)
-        send_report_to_tg(filename)
-    if sys.argv[1] == "next-month":
-        filename = "students-predicts.xlsx"
-        paraplan.create_excel_students_with_ending_subscription_in_next_month(filename)
-        send_report_to_tg(filename)
+    if schedule:
+        _run_daemon(paraplan, schedule, report_format, cache_horizon)
+        return
+    if sys.argv[1] == "serve":
+        _run_server(paraplan, cache_horizon)
+        return
+
+    if report_period:
+        paraplan.set_report_period(report_period)
+        logger.info(f"Report period: {report_period[0]} - {report_period[1]}")
+
+    recorder = None
+    if _get_cli_option("--record"):
+        recorder = Recorder(_get_cli_option("--record"))
+        recorder.attach(paraplan.session)
+
+    try:
+        # Для нескольких отчетов общие данные скачиваются заранее одним проходом
+        if len(actions) > 1:
+            prefetch_reports(paraplan, actions)
+
+        if "--verify-pruning" in sys.argv:
+            _verify_pruning(paraplan, actions)
+        else:
+            _run_reports(paraplan, actions, report_format)
+    finally:
+        if recorder:
+            recorder.save()
+
+        _save_metrics(paraplan)
 
 
 if __name__ == "__main__":
@@ -587,6 +1240,12 @@ if __name__ == "__main__":
     except CsrfTokenError as err:
         logger.error(err)
         print(err)
+    except CliArgumentError as err:
+        logger.error(err)
+        print(err)
+    except BotConfigError as err:
+        logger.error(err)
+        print(err)
     except Exception as err:
         logger.error(err, exc_info=True)
         print(f"Error: {err}")
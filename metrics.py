@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """Метрики запуска: запросы по эндпоинтам, гистограммы задержек, попадания в кэш и длительность этапов.
+
+    Задержки раскладываются по фиксированным интервалам (как в гистограммах Prometheus),
+    перцентили оцениваются по верхней границе интервала.
+    """
+
+    LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+    def __init__(self):
+        self.endpoints = dict()
+        self.cache = dict()
+        self.phases = dict()
+        self._lock = threading.Lock()
+
+    def _get_endpoint(self, endpoint: str) -> dict:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {
+                "requests": 0,
+                "errors": 0,
+                "bytes": 0,
+                "latency_sum": 0.0,
+                "latency_buckets": [0] * len(self.LATENCY_BUCKETS),
+            }
+        return self.endpoints[endpoint]
+
+    def observe_request(self, endpoint: str, latency: float, size: int, status_code: int | None) -> None:
+        """status_code None - запрос завершился сетевой ошибкой без ответа"""
+        bucket = next(index for index, bound in enumerate(self.LATENCY_BUCKETS) if latency <= bound)
+        with self._lock:
+            stats = self._get_endpoint(endpoint)
+            stats["requests"] += 1
+            stats["errors"] += status_code is None or status_code >= 400
+            stats["bytes"] += size
+            stats["latency_sum"] += latency
+            stats["latency_buckets"][bucket] += 1
+
+    def requests_count(self) -> int:
+        with self._lock:
+            return sum(stats["requests"] for stats in self.endpoints.values())
+
+    def observe_cache(self, endpoint: str, hit: bool) -> None:
+        with self._lock:
+            stats = self.cache.setdefault(endpoint, {"hits": 0, "misses": 0})
+            stats["hits" if hit else "misses"] += 1
+
+    @contextmanager
+    def phase(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_duration(name, time.perf_counter() - started_at)
+
+    def add_phase_duration(self, name: str, duration: float) -> None:
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def percentile(self, endpoint: str, quantile: float) -> float:
+        stats = self.endpoints[endpoint]
+        rank = quantile * stats["requests"]
+        cumulative = 0
+        for bound, count in zip(self.LATENCY_BUCKETS, stats["latency_buckets"]):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.LATENCY_BUCKETS[-1]
+
+    def summary(self) -> dict:
+        with self._lock:
+            cache_hits = sum(stats["hits"] for stats in self.cache.values())
+            cache_lookups = cache_hits + sum(stats["misses"] for stats in self.cache.values())
+            return {
+                "endpoints": {
+                    endpoint: {
+                        "requests": stats["requests"],
+                        "errors": stats["errors"],
+                        "bytes": stats["bytes"],
+                        "latency_avg": stats["latency_sum"] / stats["requests"],
+                        "latency_p50": self.percentile(endpoint, 0.5),
+                        "latency_p95": self.percentile(endpoint, 0.95),
+                        "latency_p99": self.percentile(endpoint, 0.99),
+                    }
+                    for endpoint, stats in self.endpoints.items()
+                },
+                "cache": {
+                    "hits": cache_hits,
+                    "lookups": cache_lookups,
+                    "hit_ratio": cache_hits / cache_lookups if cache_lookups else None,
+                },
+                "phases": dict(self.phases),
+            }
+
+    def format_summary(self) -> str:
+        summary = self.summary()
+        lines = ["Run metrics:"]
+        for endpoint, stats in sorted(summary["endpoints"].items()):
+            lines.append(
+                f"  {endpoint}: {stats['requests']} requests, {stats['errors']} errors, "
+                f"{stats['bytes'] / 1024:.1f} KiB, p50<={stats['latency_p50']}s p95<={stats['latency_p95']}s "
+                f"p99<={stats['latency_p99']}s"
+            )
+        if summary["cache"]["lookups"]:
+            lines.append(f"  cache: {summary['cache']['hits']}/{summary['cache']['lookups']} hits "
+                         f"({summary['cache']['hit_ratio']:.0%})")
+        for phase, duration in summary["phases"].items():
+            lines.append(f"  phase {phase}: {duration:.2f}s")
+        return "\n".join(lines)
+
+    def write_json(self, filename: str) -> None:
+        with open(filename, "w", encoding="utf-8") as file:
+            json.dump(self.summary(), file, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, filename: str) -> None:
+        """Сохраняет метрики в формате textfile-коллектора node_exporter (файл заменяется атомарно)"""
+        with self._lock:
+            lines = [
+                "# TYPE paraplan_requests_total counter",
+                "# TYPE paraplan_request_errors_total counter",
+                "# TYPE paraplan_response_bytes_total counter",
+                "# TYPE paraplan_request_duration_seconds histogram",
+            ]
+            for endpoint, stats in self.endpoints.items():
+                labels = f'endpoint="{endpoint}"'
+                lines.append(f"paraplan_requests_total{{{labels}}} {stats['requests']}")
+                lines.append(f"paraplan_request_errors_total{{{labels}}} {stats['errors']}")
+                lines.append(f"paraplan_response_bytes_total{{{labels}}} {stats['bytes']}")
+                cumulative = 0
+                for bound, count in zip(self.LATENCY_BUCKETS, stats["latency_buckets"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else bound
+                    lines.append(f'paraplan_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"paraplan_request_duration_seconds_sum{{{labels}}} {stats['latency_sum']}")
+                lines.append(f"paraplan_request_duration_seconds_count{{{labels}}} {stats['requests']}")
+
+            lines.append("# TYPE paraplan_cache_lookups_total counter")
+            for endpoint, stats in self.cache.items():
+                lines.append(f'paraplan_cache_lookups_total{{endpoint="{endpoint}",result="hit"}} {stats["hits"]}')
+                lines.append(f'paraplan_cache_lookups_total{{endpoint="{endpoint}",result="miss"}} {stats["misses"]}')
+
+            lines.append("# TYPE paraplan_phase_duration_seconds gauge")
+            for phase, duration in self.phases.items():
+                lines.append(f'paraplan_phase_duration_seconds{{phase="{phase}"}} {duration}')
+
+        temporary_filename = f"{filename}.tmp"
+        with open(temporary_filename, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temporary_filename, filename)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+from data_types import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class ReportService:
+    """Отчеты в виде JSON с кэшем результатов.
+
+    Результат отчета хранится ttl секунд отдельно для каждого периода. Если один и тот же отчет
+    запрошен несколько раз одновременно, вычисляется он один раз, остальные запросы ждут результата.
+    Отчеты вычисляются по очереди: compute работает с общим ParaplanAPI. Перед вычислением, если
+    загруженные данные старше ttl, вызывается reset.
+    """
+
+    def __init__(self, compute: Callable[[str, tuple | None], object], reports: list, ttl: float = 600,
+                 reset: Callable[[], None] | None = None):
+        self.reports = reports
+        self.ttl = ttl
+        self._compute = compute
+        self._reset = reset
+
+        self._results = dict()
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight(self._lock)
+        self._compute_lock = threading.Lock()
+        self._data_loaded_at = time.monotonic()
+
+    def _build(self, report: str, period: tuple | None) -> dict:
+        with self._compute_lock:
+            if self._reset and time.monotonic() - self._data_loaded_at > self.ttl:
+                self._reset()
+                self._data_loaded_at = time.monotonic()
+
+            started_at = time.perf_counter()
+            data = self._compute(report, period)
+            logger.info(f"Report {report} computed in {time.perf_counter() - started_at:.2f}s")
+
+        # ETag зависит только от данных: если после пересчета отчет не изменился, клиент получит 304
+        etag = hashlib.sha1(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+        body = json.dumps({
+            "report": report,
+            "period": [period[0].isoformat(), period[1].isoformat()] if period else None,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "data": data,
+        }, ensure_ascii=False, default=str)
+        return {
+            "body": body.encode("utf-8"),
+            "etag": f'"{etag}"',
+            "expires_at": time.monotonic() + self.ttl,
+        }
+
+    def get(self, report: str, period: tuple | None = None) -> dict:
+        """Возвращает {"body": JSON-ответ, "etag": ..., "expires_at": ...} из кэша или вычисляет отчет"""
+        # Периоды по умолчанию отсчитываются от сегодняшней даты, поэтому она входит в ключ
+        key = (report, period or date.today())
+        return self._single_flight.run(key, lambda: self._get_cached(key), lambda: self._load(key, report, period))
+
+    def _get_cached(self, key: tuple) -> dict | None:
+        result = self._results.get(key)
+        if result and result["expires_at"] > time.monotonic():
+            return result
+        return None
+
+    def _load(self, key: tuple, report: str, period: tuple | None) -> dict:
+        result = self._build(report, period)
+        with self._lock:
+            now = time.monotonic()
+            self._results = {cached_key: cached_result for cached_key, cached_result in self._results.items()
+                             if cached_result["expires_at"] > now}
+            self._results[key] = result
+        return result
+
+
+class ReportsServer(ThreadingHTTPServer):
+    """HTTP API отчетов: GET /reports - список отчетов, GET /reports/<отчет>?from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД"""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: ReportService):
+        super().__init__(address, _ReportsHandler)
+        self.service = service
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/"
+
+
+class _ReportsHandler(BaseHTTPRequestHandler):
+    server: ReportsServer
+
+    def log_message(self, format, *args):
+        logger.info(f"API {self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, body: bytes, headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, json.dumps({"error": message}, ensure_ascii=False).encode("utf-8"))
+
+    @staticmethod
+    def _get_period(query: dict) -> tuple[date, date] | None:
+        if "from" not in query:
+            if "to" in query:
+                raise ValueError("Параметр to используется только вместе с from")
+            return None
+
+        start_date = date.fromisoformat(query["from"][0])
+        end_date = date.fromisoformat(query["to"][0]) if "to" in query else date.today()
+        if end_date < start_date:
+            raise ValueError("Дата to должна быть не раньше даты from")
+        return start_date, end_date
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip("/")
+
+        if path == "/reports":
+            self._send_json(200, json.dumps({"reports": self.server.service.reports}).encode("utf-8"))
+            return
+
+        report = path.removeprefix("/reports/")
+        if not path.startswith("/reports/") or report not in self.server.service.reports:
+            self._send_error(404, "Отчет не найден")
+            return
+
+        try:
+            period = self._get_period(parse_qs(parts.query))
+        except ValueError as err:
+            self._send_error(400, f"Неверный период: {err}")
+            return
+
+        try:
+            result = self.server.service.get(report, period)
+        except Exception as err:
+            logger.error(f"Report {report} failed: {err}", exc_info=True)
+            self._send_error(500, "Не удалось построить отчет")
+            return
+
+        headers = {
+            "ETag": result["etag"],
+            "Cache-Control": f"max-age={max(0, int(result['expires_at'] - time.monotonic()))}",
+        }
+        if_none_match = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+        if result["etag"] in if_none_match or "*" in if_none_match:
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        self._send_json(200, result["body"], headers)
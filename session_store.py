@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from requests.cookies import RequestsCookieJar
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка файла недоступна, хранилищем пользуется один процесс
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Хранилище авторизованных сессий Paraplan на диске: cookies и XSRF-токен по ключу учетной записи.
+
+    Файл доступен только владельцу. Чтение, проверка и обновление сессии выполняются под
+    эксклюзивной блокировкой файла, поэтому несколько одновременно запущенных процессов
+    не логинятся параллельно: первый обновляет сессию, остальные получают уже свежую.
+    """
+
+    def __init__(self, path: str = "session.json"):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    @contextmanager
+    def lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return dict()
+        except json.JSONDecodeError:
+            logger.warning(f"Session store {self.path} is corrupted, ignoring it")
+            return dict()
+
+    def load(self, key: str) -> tuple[RequestsCookieJar, str, float] | None:
+        """Возвращает сохраненные cookies, XSRF-токен и время сохранения (time.time())
+        или None, если сессии нет. Вызывать под lock()"""
+        entry = self._read().get(key)
+        if not entry:
+            return None
+
+        now = time.time()
+        cookies = RequestsCookieJar()
+        for cookie in entry["cookies"]:
+            if cookie["expires"] and cookie["expires"] < now:
+                continue
+            cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"],
+                        secure=cookie["secure"], expires=cookie["expires"])
+        return cookies, entry["csrf_token"], entry.get("saved_at", 0.0)
+
+    def save(self, key: str, cookies: RequestsCookieJar, csrf_token: str) -> float:
+        """Сохраняет сессию атомарной заменой файла и возвращает время сохранения. Вызывать под lock()"""
+        saved_at = time.time()
+        entries = self._read()
+        entries[key] = {
+            "cookies": [
+                {"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path,
+                 "secure": cookie.secure, "expires": cookie.expires}
+                for cookie in cookies
+            ],
+            "csrf_token": csrf_token,
+            "saved_at": saved_at,
+        }
+
+        temporary_path = f"{self.path}.tmp"
+        file_descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+            json.dump(entries, file)
+        os.replace(temporary_path, self.path)
+        return saved_at
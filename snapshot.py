@@ -0,0 +1,89 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from data_types import _subscription_date
+
+logger = logging.getLogger(__name__)
+
+
+class StudentsSnapshot:
+    """Локальный снимок учеников на SQLite.
+
+    Для каждого ученика хранится дата окончания последнего абонемента: по ней при следующем запуске
+    вместо всех абонементов ученика, который по этой дате не может попасть в отчет, запрашивается один:
+    так проверяется, не купил ли он новый абонемент. Сами абонементы не хранятся.
+    Раз в `full_sync_days` дней снимок нужно полностью синхронизировать с Paraplan.
+    """
+
+    def __init__(self, path: str = "snapshot.sqlite3", full_sync_days: int = 7, full_sync: bool = False):
+        self.full_sync_days = full_sync_days
+        self.full_sync = full_sync
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS last_end_dates ("
+            "student_id TEXT PRIMARY KEY, last_end_date TEXT, synced_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+        self._connection.commit()
+
+    def _get_meta(self, key: str) -> float | None:
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def last_sync(self) -> float | None:
+        with self._lock:
+            return self._get_meta("last_sync")
+
+    def is_full_sync_due(self) -> bool:
+        if self.full_sync:
+            return True
+
+        with self._lock:
+            last_full_sync = self._get_meta("last_full_sync")
+        return last_full_sync is None or time.time() - last_full_sync >= self.full_sync_days * 24 * 60 * 60
+
+    def get_last_end_dates(self) -> dict:
+        """Даты окончания последних абонементов: {id ученика: дата или None, если абонементов нет}"""
+        with self._lock:
+            return {
+                student_id: date.fromisoformat(last_end_date) if last_end_date else None
+                for student_id, last_end_date in self._connection.execute(
+                    "SELECT student_id, last_end_date FROM last_end_dates"
+                )
+            }
+
+    def save(self, student_ids: list, subscriptions: dict, full: bool = False) -> None:
+        """Сохраняет даты окончания по загруженным абонементам учеников. Ученики не из student_ids удаляются"""
+        now = time.time()
+        rows = []
+        for student_id, items in subscriptions.items():
+            end_dates = [_subscription_date(item["endDate"]) for item in items if item.get("endDate")]
+            rows.append((student_id, max(end_dates).isoformat() if end_dates else None, now))
+
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO last_end_dates (student_id, last_end_date, synced_at) VALUES (?, ?, ?)", rows
+            )
+            stored_ids = {student_id for student_id, in self._connection.execute(
+                "SELECT student_id FROM last_end_dates"
+            )}
+            self._connection.executemany("DELETE FROM last_end_dates WHERE student_id = ?",
+                                         [(student_id,) for student_id in stored_ids - set(student_ids)])
+
+            self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_sync', ?)", (now,))
+            if full:
+                self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_full_sync', ?)",
+                                         (now,))
+            self._connection.commit()
+
+        logger.info(f"Students snapshot saved: {len(student_ids)} students, {len(rows)} updated")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,278 @@
+"""Локальная замена Paraplan для разработки и бенчмарков.
+
+Сервер отвечает на те же эндпоинты, что использует ParaplanAPI: вход, min-info, абонементы,
+разбивки посещений, forAttendanceScreen и группы. Ответы берутся либо из записи реальных ответов
+(см. Recorder и опцию --record в main.py), либо из синтетической компании с заданным числом
+учеников, групп и дней посещений.
+
+    python stand_in.py --students 3000 --groups 40 --days 60 --latency 0.05
+    python stand_in.py --replay recording.json
+
+Чтобы скрипт ходил в локальный сервер, укажите PARAPLAN_BASE_URL=http://127.0.0.1:8800/
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from data_types import StatusesEnum
+from transport import get_endpoint_name
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_path(url: str) -> str:
+    """Путь с параметрами запроса без хоста: ключ записи ответа"""
+    parts = urlsplit(url)
+    path = re.sub("/{2,}", "/", parts.path)
+    return f"{path}?{parts.query}" if parts.query else path
+
+
+class Recorder:
+    """Записывает ответы Paraplan, полученные через requests.Session, в JSON-файл для воспроизведения"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.responses = dict()
+        self._lock = threading.Lock()
+
+    def attach(self, session: requests.Session) -> None:
+        session.hooks["response"].append(self._record)
+
+    def _record(self, response: requests.Response, *args, **kwargs) -> None:
+        endpoint = get_endpoint_name(response.url)
+        # Ответ на вход не нужен для воспроизведения, а тело запроса содержит пароль
+        if endpoint == "login" or response.status_code != 200:
+            return
+
+        with self._lock:
+            self.responses[f"{response.request.method} {_normalize_path(response.url)}"] = response.text
+
+    def save(self) -> None:
+        with self._lock, open(self.filename, "w", encoding="utf-8") as file:
+            json.dump(self.responses, file, ensure_ascii=False)
+        logger.info(f"{len(self.responses)} responses recorded to {self.filename}")
+
+
+def _date_dict(day: date) -> dict:
+    return {"year": day.year, "month": day.month, "day": day.day}
+
+
+class SyntheticCompany:
+    """Синтетическая компания: ученики с историей абонементов, группы и посещения за days дней до сегодня"""
+
+    STATUSES = [status.value for status in StatusesEnum]
+
+    def __init__(self, students: int = 300, groups: int = 20, days: int = 60, seed: int = 0):
+        rnd = random.Random(seed)
+        today = date.today()
+
+        self.students = [{"id": f"student-{index}", "name": f"Ученик {index}"} for index in range(students)]
+        self.groups = {
+            f"group-{index}": {
+                "id": f"group-{index}",
+                "type": rnd.choice(["GROUP", "INDIVIDUAL"]),
+                "teacherList": [{"name": f"Педагог {index % 7}"}] if index % 5 else []
+            }
+            for index in range(max(1, groups))
+        }
+
+        self.subscriptions = dict()
+        for student in self.students:
+            subscriptions = []
+            start_date = today - timedelta(days=rnd.randint(0, 2 * days))
+            for index in range(rnd.randint(0, 12)):
+                end_date = start_date + timedelta(days=rnd.randint(20, 40))
+                subscriptions.append({
+                    "id": f"{student['id']}-subscription-{index}",
+                    "startDate": _date_dict(start_date),
+                    "endDate": _date_dict(end_date),
+                    "lessonQuantity": rnd.choice([1, 8, 12]),
+                    "totalPrice": rnd.choice([40, 80, 120]),
+                    "groupList": [{"id": rnd.choice(list(self.groups))}],
+                })
+                start_date = end_date + timedelta(days=rnd.randint(-5, 25))
+            self.subscriptions[student["id"]] = subscriptions[::-1]
+
+        self.attendances = dict()
+        self.breakdowns = dict()
+        for offset in range(-days, 15):
+            day = today + timedelta(days=offset)
+            for kind in ("group", "individual"):
+                day_attendances = []
+                for _ in range(rnd.randint(0, 6)):
+                    attendance = {
+                        "id": f"attendance-{len(self.attendances)}",
+                        "dateTime": {
+                            **_date_dict(day), "hour": rnd.randint(9, 20), "minute": rnd.choice([0, 15, 30])
+                        },
+                        "teacherList": [{"teacherInfo": {"name": f"Педагог {rnd.randint(0, 6)}"}}]
+                        if rnd.random() > 0.1 else [],
+                        "attendeeList": [
+                            {"studentInfo": student, "statusId": rnd.choice(self.STATUSES)}
+                            for student in rnd.sample(self.students, min(len(self.students), rnd.randint(1, 8)))
+                        ],
+                    }
+                    self.attendances[attendance["id"]] = attendance
+                    day_attendances.append(attendance)
+                self.breakdowns[(kind, day)] = day_attendances
+
+    @staticmethod
+    def _query_date(query: dict, prefix: str) -> date | None:
+        if f"{prefix}.day" not in query:
+            return None
+        return date(int(query[f"{prefix}.year"][0]), int(query[f"{prefix}.month"][0]), int(query[f"{prefix}.day"][0]))
+
+    def respond(self, method: str, path: str) -> tuple[int, object]:
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        endpoint = get_endpoint_name(parts.path)
+
+        if endpoint == "user":
+            return 200, {"user": {"name": "stand-in"}}
+        if endpoint == "students" and method == "POST":
+            return 200, {"studentList": self.students}
+        if endpoint == "attendances_statuses":
+            return 200, [{"id": status.value, "name": status.name} for status in StatusesEnum]
+        if endpoint == "subscriptions":
+            student_id = parts.path.split("/")[-3]
+            period_start, period_end = self._query_date(query, "from"), self._query_date(query, "to")
+            subscriptions = [
+                subscription for subscription in self.subscriptions.get(student_id, [])
+                if (not period_start or date(**subscription["endDate"]) >= period_start)
+                and (not period_end or date(**subscription["startDate"]) <= period_end)
+            ]
+            page, size = int(query.get("page", ["1"])[0]), int(query.get("size", ["10"])[0])
+            return 200, {"itemList": subscriptions[(page - 1) * size:page * size], "totalCount": len(subscriptions)}
+        if endpoint in ("group_attendances", "individual_attendances"):
+            day = self._query_date(query, "date")
+            if endpoint == "group_attendances":
+                attendances = self.breakdowns.get(("group", day), [])
+                return 200, {"breakdown": {"attendanceList": [{"id": attendance["id"]} for attendance in attendances]}}
+            return 200, {"groupList": [{"attendanceList": self.breakdowns.get(("individual", day), [])}]}
+        if endpoint == "attendance_for_screen":
+            attendance = self.attendances.get(parts.path.split("/")[-2])
+            return (200, {"attendance": attendance}) if attendance else (404, {})
+        if endpoint == "group_info":
+            group = self.groups.get(parts.path.split("/")[-1])
+            return (200, {"group": group}) if group else (404, {})
+
+        return 404, {}
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP-сервер, отвечающий вместо Paraplan. Считает запросы и отправленные байты по эндпоинтам"""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], company: SyntheticCompany | None = None,
+                 recording: dict | None = None, latency: float = 0.0):
+        super().__init__(address, _StandInHandler)
+        self.company = company
+        self.recording = recording or dict()
+        self.latency = latency
+
+        self.requests_count = dict()
+        self.bytes_sent = 0
+        self._stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/"
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self.requests_count = dict()
+            self.bytes_sent = 0
+
+    def _count(self, endpoint: str, size: int) -> None:
+        with self._stats_lock:
+            self.requests_count[endpoint] = self.requests_count.get(endpoint, 0) + 1
+            self.bytes_sent += size
+
+    def respond(self, method: str, path: str) -> tuple[int, bytes]:
+        path = _normalize_path(path)
+        # Вход всегда успешен, чтобы воспроизведение не зависело от учетных данных
+        if get_endpoint_name(path) == "login":
+            return 200, b"{}"
+        if get_endpoint_name(path) == "user" and not self.company:
+            return 200, b'{"user": {}}'
+
+        recorded = self.recording.get(f"{method} {path}")
+        if recorded is not None:
+            return 200, recorded.encode("utf-8")
+        if self.company:
+            status, body = self.company.respond(method, path)
+            return status, json.dumps(body, ensure_ascii=False).encode("utf-8")
+        return 404, b"{}"
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method: str) -> None:
+        if self.headers.get("Content-Length"):
+            self.rfile.read(int(self.headers["Content-Length"]))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        status, body = self.server.respond(method, self.path)
+        self.server._count(get_endpoint_name(self.path), len(body))
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if get_endpoint_name(self.path) == "login":
+            self.send_header("Set-Cookie", "XSRF-TOKEN=stand-in-token; Path=/")
+            self.send_header("Set-Cookie", "SESSION=stand-in-session; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Paraplan")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа в секундах")
+    parser.add_argument("--replay", help="файл с записанными ответами")
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    recording = None
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as file:
+            recording = json.load(file)
+    company = None if recording else SyntheticCompany(args.students, args.groups, args.days, args.seed)
+
+    server = StandInServer((args.host, args.port), company=company, recording=recording, latency=args.latency)
+    print(f"Paraplan stand-in: {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
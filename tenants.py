@@ -0,0 +1,205 @@
+"""Отчеты для нескольких компаний (филиалов) Paraplan за один запуск.
+
+Компании описываются в JSON-файле. Отчеты каждой компании строятся в отдельном процессе, количество
+одновременно работающих процессов задает --processes, а потоки и лимит запросов задаются для каждой
+компании отдельно. Кэш ответов, снимок учеников, сессия и отчеты компании хранятся в своей папке.
+
+    python tenants.py tenants.json --processes 2 --output combined --send
+
+Формат файла:
+
+    {"tenants": [
+        {"name": "center", "login": "center@example.com", "password_env": "CENTER_PASS",
+         "actions": "all", "workers": 8, "rate_limit": 10},
+        {"name": "north", "login": "north@example.com", "password": "...", "actions": "current-month"}
+    ]}
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+
+from attendance_store import AttendanceStore
+from cache import ResponseCache
+from exceptions import BotConfigError, CliArgumentError
+from main import REPORT_FORMATS, ParaplanAPI, create_report, parse_actions, prefetch_reports
+from session_store import SessionStore
+from snapshot import StudentsSnapshot
+from trends import TrendStore
+
+logger = logging.getLogger(__name__)
+
+
+OUTPUT_MODES = ("per-company", "combined")
+
+# Ограничения Excel на название листа
+SHEET_TITLE_MAX_LENGTH = 31
+SHEET_TITLE_INVALID_CHARACTERS = re.compile(r"[\[\]:*?/\\]")
+
+
+def load_tenants(path: str) -> list:
+    """Читает и проверяет список компаний из JSON-файла"""
+    try:
+        with open(path, encoding="utf-8") as file:
+            tenants = json.load(file).get("tenants")
+    except (OSError, json.JSONDecodeError) as err:
+        raise CliArgumentError(f"Не удалось прочитать файл компаний {path}: {err}")
+
+    if not tenants:
+        raise CliArgumentError(f"В файле {path} нет ни одной компании (ключ tenants)")
+
+    names = set()
+    for tenant in tenants:
+        name = tenant.get("name")
+        if not name or not re.fullmatch(r"[\w.-]+", name) or name in names:
+            raise CliArgumentError(f"Название компании должно быть уникальным и состоять из букв, цифр, "
+                                   f"точек и дефисов: {name}")
+        names.add(name)
+
+        if not tenant.get("login") or not (tenant.get("password") or tenant.get("password_env")):
+            raise CliArgumentError(f"Для компании {name} укажите login и password или password_env")
+        if tenant.get("password_env") and os.getenv(tenant["password_env"]) is None:
+            raise CliArgumentError(f"Для компании {name} не задана переменная окружения {tenant['password_env']}")
+
+        tenant["actions"] = parse_actions(tenant.get("actions", "all"))
+    return tenants
+
+
+def run_tenant(tenant: dict, output_dir: str, report_format: str, cache_horizon: int) -> dict:
+    """Строит отчеты одной компании в ее папке. Выполняется в отдельном процессе
+
+    Возвращает {"name": ..., "files": [(действие, файл отчета), ...], "error": None или текст ошибки}.
+    """
+    name = tenant["name"]
+    tenant_dir = os.path.join(output_dir, name)
+    os.makedirs(tenant_dir, exist_ok=True)
+
+    files = []
+    try:
+        # Ключ кэша - URL запроса, одинаковый у всех компаний, поэтому кэш у каждой компании свой
+        paraplan = ParaplanAPI(
+            max_workers=tenant.get("workers", 1),
+            cache=ResponseCache(os.path.join(tenant_dir, "cache.sqlite3"), immutable_after_days=cache_horizon),
+            rate_limit=tenant.get("rate_limit"),
+            timeout=tenant.get("timeout", 60),
+            retries=tenant.get("retries", 3),
+            session_store=SessionStore(os.path.join(tenant_dir, "session.json")),
+            snapshot=StudentsSnapshot(os.path.join(tenant_dir, "snapshot.sqlite3")),
+            attendance_store=AttendanceStore(os.path.join(tenant_dir, "attendances.store"),
+                                             immutable_after_days=cache_horizon),
+            trends=TrendStore(os.path.join(tenant_dir, "trends.sqlite3")),
+            login=tenant["login"],
+            password=tenant.get("password") or os.getenv(tenant["password_env"]),
+        )
+
+        actions = tenant["actions"]
+        if len(actions) > 1:
+            prefetch_reports(paraplan, actions)
+
+        for action in actions:
+            filename = os.path.join(tenant_dir, f"{name}-{action}.{report_format}")
+            create_report(paraplan, action, filename)
+            files.append((action, filename))
+
+        paraplan.save_snapshot()
+        paraplan.save_attendance_store()
+        logger.info(f"Tenant {name}: {paraplan.metrics.format_summary()}")
+        return {"name": name, "files": files, "error": None}
+    except Exception as err:
+        logger.error(f"Tenant {name} failed: {err}", exc_info=True)
+        return {"name": name, "files": files, "error": str(err)}
+
+
+def _get_sheet_title(title: str, used_titles: set) -> str:
+    """Название листа без недопустимых символов, не длиннее 31 символа и не совпадающее с уже занятыми"""
+    title = SHEET_TITLE_INVALID_CHARACTERS.sub("_", title)[:SHEET_TITLE_MAX_LENGTH]
+    unique_title, number = title, 1
+    while unique_title.lower() in used_titles:
+        number += 1
+        suffix = f" ({number})"
+        unique_title = title[:SHEET_TITLE_MAX_LENGTH - len(suffix)] + suffix
+    used_titles.add(unique_title.lower())
+    return unique_title
+
+
+def combine_workbooks(results: list, filename: str) -> None:
+    """Собирает XLSX-отчеты всех компаний в одну книгу: лист на каждый лист каждого отчета"""
+    combined = openpyxl.Workbook(write_only=True)
+    used_titles = set()
+
+    for result in results:
+        for action, report_filename in result["files"]:
+            workbook = openpyxl.load_workbook(report_filename, read_only=True)
+            for sheet in workbook.worksheets:
+                title = f"{result['name']} {action}"
+                if len(workbook.worksheets) > 1:
+                    title += f" {sheet.title}"
+                combined_sheet = combined.create_sheet(_get_sheet_title(title, used_titles))
+                for row in sheet.iter_rows(values_only=True):
+                    combined_sheet.append(row)
+            workbook.close()
+            os.remove(report_filename)
+
+    combined.save(filename)
+    logger.info(f"Combined workbook {filename} created")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("config", help="JSON-файл со списком компаний")
+    parser.add_argument("--processes", type=int, default=2, help="сколько компаний обрабатывать одновременно")
+    parser.add_argument("--output", choices=OUTPUT_MODES, default="per-company",
+                        help="отдельные файлы каждой компании или одна общая книга")
+    parser.add_argument("--output-dir", default="tenants", help="папка для данных и отчетов компаний")
+    parser.add_argument("--combined-filename", default="reports.xlsx", help="имя общей книги")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="xlsx")
+    parser.add_argument("--cache-horizon", type=int, default=7)
+    parser.add_argument("--send", action="store_true", help="отправить отчеты в Telegram")
+    args = parser.parse_args()
+
+    if args.output == "combined" and args.format != "xlsx":
+        raise CliArgumentError("Общая книга (--output combined) поддерживается только для формата xlsx")
+
+    send_report_to_tg = None
+    if args.send:
+        # Telegram нужен только для --send: без него скрипт работает без BOT_TOKEN и USER_IDS
+        from bot import get_bot_config, send_report_to_tg
+        get_bot_config()
+
+    tenants = load_tenants(args.config)
+    logger.info(f"Running reports for {len(tenants)} tenants in {args.processes} processes")
+    with ProcessPoolExecutor(max_workers=max(1, min(args.processes, len(tenants)))) as executor:
+        results = list(executor.map(run_tenant, tenants, [args.output_dir] * len(tenants),
+                                    [args.format] * len(tenants), [args.cache_horizon] * len(tenants)))
+
+    filenames = [filename for result in results for _, filename in result["files"]]
+    if args.output == "combined" and filenames:
+        combined_filename = os.path.join(args.output_dir, args.combined_filename)
+        combine_workbooks(results, combined_filename)
+        filenames = [combined_filename]
+
+    for filename in filenames:
+        if send_report_to_tg:
+            send_report_to_tg(filename)
+        else:
+            print(filename)
+
+    for result in results:
+        print(f"{result['name']}: ошибка: {result['error']}" if result["error"] else f"{result['name']}: готово")
+
+    if any(result["error"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (CliArgumentError, BotConfigError) as err:
+        logger.error(err)
+        print(err)
+        sys.exit(2)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+from attendance_store import AttendanceStore
+from data_types import Attendance, Attendee, StatusesEnum
+
+TRIAL = StatusesEnum.ATTENDED_TRIAL.value
+ATTEND = StatusesEnum.ATTEND.value
+
+
+class AttendanceStoreFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "attendances.store")
+        self.old_day = date.today() - timedelta(days=30)
+        self.recent_day = date.today() - timedelta(days=1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _fill(self, store: AttendanceStore) -> None:
+        store.append("group", self.old_day, [
+            Attendance(10, 30, ("Педагог 1",),
+                       (Attendee("s1", "Ученик 1", TRIAL), Attendee("s2", "Ученик 2", ATTEND))),
+            Attendance(None, None, (), (Attendee("s3", "Ученик 3", None),)),
+            Attendance(12, 0, ("Педагог 2",), ()),
+        ])
+        store.append("individual", self.old_day,
+                     [Attendance(9, 5, ("Педагог 1",), (Attendee("s2", "Ученик 2", TRIAL),))])
+        store.append("group", self.recent_day, [Attendance(18, 0, ("Педагог 2",), (Attendee("s4", "Ученик 4", TRIAL),))])
+
+    def _snapshot(self, store: AttendanceStore, period: tuple) -> tuple:
+        return (
+            store.get_attendees(period, (TRIAL, ATTEND)),
+            store.get_student_ids(period),
+            store.get_weekday_load(period),
+            store.get_teachers_stats(period, "group").get_stats(),
+            store.get_teachers_stats(period, "individual").get_stats(),
+        )
+
+    def test_saved_days_are_mapped_back_unchanged(self):
+        store = AttendanceStore(self.path)
+        self._fill(store)
+        old_period = (self.old_day, self.old_day)
+        expected = self._snapshot(store, old_period)
+        store.save()
+        store.close()
+
+        loaded = AttendanceStore(self.path)
+        self.assertIsNotNone(loaded._mapped)
+        self.assertEqual(self._snapshot(loaded, old_period), expected)
+        self.assertEqual(loaded.missing_days("group", old_period), [])
+        self.assertEqual(loaded.missing_days("individual", old_period), [])
+        # Дни моложе горизонта в файл не попадают
+        self.assertEqual(loaded.missing_days("group", (self.recent_day, self.recent_day)), [self.recent_day])
+        loaded.close()
+
+    def test_append_after_load_and_save_again(self):
+        store = AttendanceStore(self.path)
+        self._fill(store)
+        store.save()
+        store.close()
+
+        loaded = AttendanceStore(self.path)
+        other_day = self.old_day - timedelta(days=1)
+        loaded.append("group", other_day, [Attendance(11, 0, ("Педагог 3",), (Attendee("s5", "Ученик 5", TRIAL),))])
+        expected = self._snapshot(loaded, (other_day, self.old_day))
+        loaded.save()
+        loaded.close()
+
+        reloaded = AttendanceStore(self.path)
+        self.assertEqual(self._snapshot(reloaded, (other_day, self.old_day)), expected)
+        reloaded.close()
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["attendances.store", "attendances.store.lock"])
+
+    def test_unchanged_days_are_not_rewritten(self):
+        store = AttendanceStore(self.path)
+        self._fill(store)
+        store.save()
+        modified_at = os.stat(self.path).st_mtime_ns
+
+        store.append("group", date.today(), [])
+        store.save()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, modified_at)
+        store.close()
+
+    def test_corrupted_file_is_ignored(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a store")
+
+        with self.assertLogs("attendance_store", "WARNING"):
+            store = AttendanceStore(self.path)
+        self.assertEqual(len(store), 0)
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from datetime import datetime, timedelta, time as day_time
+
+from daemon import ScheduleEntry, Scheduler, parse_schedule
+from exceptions import CliArgumentError
+
+
+class ScheduleEntryTest(unittest.TestCase):
+    def test_daily(self):
+        entry = ScheduleEntry("current-week", "daily", day_time(9, 0))
+        self.assertEqual(entry.next_run(datetime(2026, 3, 2, 8, 0)), datetime(2026, 3, 2, 9, 0))
+        # Запуск строго после after
+        self.assertEqual(entry.next_run(datetime(2026, 3, 2, 9, 0)), datetime(2026, 3, 3, 9, 0))
+
+    def test_weekday(self):
+        entry = ScheduleEntry("current-week", "mon", day_time(9, 30))
+        # 2026-03-04 - среда
+        self.assertEqual(entry.next_run(datetime(2026, 3, 4, 12, 0)), datetime(2026, 3, 9, 9, 30))
+
+    def test_day_of_month_skips_short_months(self):
+        entry = ScheduleEntry("current-month", "31", day_time(7, 0))
+        self.assertEqual(entry.next_run(datetime(2026, 1, 31, 7, 0)), datetime(2026, 3, 31, 7, 0))
+        self.assertEqual(entry.next_run(datetime(2026, 4, 1)), datetime(2026, 5, 31, 7, 0))
+
+    def test_parse(self):
+        entries = parse_schedule("current-week=mon 09:00; next-month=25 18:30;")
+        self.assertEqual([(entry.action, entry.day, entry.at) for entry in entries],
+                         [("current-week", "mon", day_time(9, 0)), ("next-month", "25", day_time(18, 30))])
+
+        for text in ("current-week=mon 9", "current-week=monday 09:00", "current-week=32 09:00"):
+            with self.subTest(text=text), self.assertRaises(CliArgumentError):
+                ScheduleEntry.parse(text)
+
+
+class FakeClock:
+    """Часы, которые двигает только sleep"""
+
+    def __init__(self, now: datetime):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += timedelta(seconds=seconds)
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2026, 3, 2, 8, 0))
+        self.calls = []
+        self.scheduler = Scheduler(
+            parse_schedule("current-week=daily 09:00;teachers-stats=mon 09:00;next-month=daily 18:00"),
+            prefetch=lambda actions: self.calls.append(("prefetch", self.clock.now, actions)),
+            run=lambda actions: self.calls.append(("run", self.clock.now, actions)),
+            prefetch_lead=timedelta(minutes=30), clock=self.clock, sleep=self.clock.sleep
+        )
+
+    def test_next_run_groups_actions(self):
+        self.assertEqual(self.scheduler.get_next_run(),
+                         (datetime(2026, 3, 2, 9, 0), ["current-week", "teachers-stats"]))
+
+    def test_prefetch_before_run(self):
+        self.scheduler.run_pending()
+
+        actions = ["current-week", "teachers-stats"]
+        self.assertEqual(self.calls, [("prefetch", datetime(2026, 3, 2, 8, 30), actions),
+                                      ("run", datetime(2026, 3, 2, 9, 0), actions)])
+        self.assertEqual(self.clock.sleeps, [30 * 60, 30 * 60])
+
+    def test_run_is_not_repeated_when_clock_lags(self):
+        self.scheduler.run_pending()
+        self.clock.now = datetime(2026, 3, 2, 8, 59)
+
+        self.assertEqual(self.scheduler.get_next_run(), (datetime(2026, 3, 2, 18, 0), ["next-month"]))
+
+    def test_errors_do_not_stop_scheduler(self):
+        def fail(actions):
+            raise RuntimeError("Paraplan недоступен")
+
+        self.scheduler._run = fail
+        with self.assertLogs("daemon", "ERROR"):
+            self.scheduler.run_pending()
+        self.scheduler.run_pending()
+
+        self.assertEqual(self.calls[-1][:2], ("prefetch", datetime(2026, 3, 2, 17, 30)))
+
+
+if __name__ == "__main__":
+    unittest.main()
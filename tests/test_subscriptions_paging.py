@@ -0,0 +1,133 @@
+import re
+import unittest
+from datetime import date, timedelta
+
+from data_types import SubscriptionsIndex
+from main import ParaplanAPI
+
+
+def _date_dict(day: date) -> dict:
+    return {"year": day.year, "month": day.month, "day": day.day}
+
+
+def _subscriptions(count: int) -> list:
+    start = date(2024, 1, 1)
+    return [
+        {
+            "id": f"subscription-{index}",
+            "startDate": _date_dict(start + timedelta(days=10 * index)),
+            "endDate": _date_dict(start + timedelta(days=10 * index + 30)),
+            "lessonQuantity": 8,
+        }
+        for index in range(count)
+    ]
+
+
+class FakeSubscriptionsServer:
+    """Отдает абонементы страницами так же, как Paraplan: элементы с (page - 1) * size по page * size"""
+
+    def __init__(self, subscriptions: list, metadata: str | None = "totalCount", max_page_size: int | None = None):
+        self.subscriptions = subscriptions
+        self.metadata = metadata
+        self.max_page_size = max_page_size
+        self.requests = []
+
+    def get_json(self, url: str, *args) -> dict:
+        page = int(re.search(r"page=(\d+)", url)[1])
+        size = int(re.search(r"size=(\d+)", url)[1])
+        self.requests.append((page, size))
+        if self.max_page_size:
+            size = min(size, self.max_page_size)
+
+        response = {"itemList": self.subscriptions[(page - 1) * size:page * size]}
+        if self.metadata == "totalCount":
+            response["totalCount"] = len(self.subscriptions)
+        elif self.metadata == "totalPages":
+            response["totalPages"] = -(-len(self.subscriptions) // size)
+        return response
+
+
+def _create_api(server: FakeSubscriptionsServer, page_size: int = 10) -> ParaplanAPI:
+    # Без входа в Paraplan: пагинации нужны только размер страницы и _get_json
+    api = ParaplanAPI.__new__(ParaplanAPI)
+    api.subscriptions_page_size = page_size
+    api._get_json = server.get_json
+    return api
+
+
+class SubscriptionsPagingTest(unittest.TestCase):
+    def test_doubled_pages_continue_without_gaps_or_repeats(self):
+        subscriptions = _subscriptions(95)
+        server = FakeSubscriptionsServer(subscriptions)
+
+        received = list(_create_api(server)._iter_student_subscriptions("student"))
+
+        self.assertEqual(received, subscriptions)
+        # Со второй страницы размер удваивается при том же номере: смещения 0, 10, 20, 40, 80
+        self.assertEqual(server.requests, [(1, 10), (2, 10), (2, 20), (2, 40), (2, 80)])
+
+    def test_page_size_stops_at_maximum(self):
+        subscriptions = _subscriptions(450)
+        server = FakeSubscriptionsServer(subscriptions)
+
+        received = list(_create_api(server, page_size=25)._iter_student_subscriptions("student"))
+
+        self.assertEqual(received, subscriptions)
+        self.assertEqual(server.requests, [(1, 25), (2, 25), (2, 50), (2, 100), (3, 100), (4, 100), (5, 100)])
+
+    def test_all_lengths_with_and_without_metadata(self):
+        for metadata in ("totalCount", "totalPages", None):
+            for count in (0, 1, 9, 10, 11, 20, 39, 40, 41, 80, 81, 160, 161, 333):
+                with self.subTest(metadata=metadata, count=count):
+                    subscriptions = _subscriptions(count)
+                    server = FakeSubscriptionsServer(subscriptions, metadata)
+                    self.assertEqual(list(_create_api(server)._iter_student_subscriptions("student")), subscriptions)
+
+    def test_capped_page_size_does_not_cut_history(self):
+        for metadata in ("totalCount", "totalPages"):
+            for max_page_size in (7, 15, 50):
+                with self.subTest(metadata=metadata, max_page_size=max_page_size):
+                    subscriptions = _subscriptions(310)
+                    server = FakeSubscriptionsServer(subscriptions, metadata, max_page_size)
+                    self.assertEqual(list(_create_api(server)._iter_student_subscriptions("student")), subscriptions)
+
+    def test_next_page_is_requested_only_when_needed(self):
+        server = FakeSubscriptionsServer(_subscriptions(95))
+
+        first = next(_create_api(server)._iter_student_subscriptions("student", page_size=1))
+
+        self.assertEqual(first["id"], "subscription-0")
+        self.assertEqual(server.requests, [(1, 1)])
+
+    def test_single_lesson_subscriptions_are_skipped(self):
+        subscriptions = _subscriptions(15)
+        subscriptions[3]["lessonQuantity"] = 1
+        server = FakeSubscriptionsServer(subscriptions)
+
+        received = list(_create_api(server)._iter_student_subscriptions("student"))
+
+        self.assertEqual(received, subscriptions[:3] + subscriptions[4:])
+
+
+class SubscriptionsIndexTest(unittest.TestCase):
+    def setUp(self):
+        # Сервер отдает абонементы от новых к старым, индекс сохраняет этот порядок в выборках
+        self.subscriptions = _subscriptions(6)[::-1]
+        self.index = SubscriptionsIndex(self.subscriptions)
+
+    def test_ending_in_period(self):
+        # Окончания: 31.01, 10.02, 20.02, 01.03, 11.03, 21.03
+        ending = self.index.ending_in((date(2024, 2, 10), date(2024, 3, 1)))
+        self.assertEqual([item["id"] for item in ending], ["subscription-3", "subscription-2", "subscription-1"])
+        self.assertEqual(len(self.index.ending_in((date(2024, 3, 22), None))), 0)
+        self.assertEqual(self.index.ending_in((None, None)), self.subscriptions)
+
+    def test_active_in_period(self):
+        # Начала: 01.01, 11.01, 21.01, 31.01, 10.02, 20.02
+        active = self.index.active_in((date(2024, 3, 5), date(2024, 3, 6)))
+        self.assertEqual([item["id"] for item in active], ["subscription-5", "subscription-4"])
+        self.assertEqual(len(self.index.active_in((date(2024, 3, 5), None))), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+ENDPOINT_ROUTES = (
+    ("api/public/login", "login"),
+    ("api/open/user", "user"),
+    ("students/min-info", "students"),
+    ("/subscriptions/paginated", "subscriptions"),
+    ("breakdown/group", "group_attendances"),
+    ("breakdown/individual", "individual_attendances"),
+    ("/forAttendanceScreen", "attendance_for_screen"),
+    ("api/open/groups/", "group_info"),
+    ("attendances/students/statuses", "attendances_statuses"),
+)
+
+
+def get_endpoint_name(url: str) -> str:
+    """Имя эндпоинта Paraplan по URL запроса - для метрик и записи ответов"""
+    for marker, name in ENDPOINT_ROUTES:
+        if marker in url:
+            return name
+    return "other"
+
+
+class RateLimiter:
+    """Ограничитель частоты запросов (token bucket): не больше rate запросов в секунду в среднем,
+    с допустимой пачкой до burst запросов подряд"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+class Transport:
+    """HTTP-транспорт для запросов к Paraplan.
+
+    Пул соединений рассчитан на pool_size параллельных запросов, у каждого запроса есть таймаут.
+    GET-запросы при сетевых ошибках и ответах 429/5xx повторяются с экспоненциальной задержкой
+    и случайным разбросом (или через Retry-After из ответа). Каждая попытка, в том числе повторная,
+    проходит через общий ограничитель частоты и учитывается в метриках. Если сервер ответил 401/403,
+    вызывается reauthenticate и запрос повторяется один раз.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    AUTH_ERROR_STATUSES = (401, 403)
+
+    def __init__(self, pool_size: int = 10, timeout: float | tuple[float, float] = (10, 60), retries: int = 3,
+                 backoff_factor: float = 0.5, backoff_jitter: float = 0.5, rate_limiter: RateLimiter | None = None,
+                 reauthenticate: Callable[[], None] | None = None, metrics: Metrics | None = None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.reauthenticate = reauthenticate
+
+        # Повторы выполняет сам транспорт, а не urllib3: иначе они идут мимо ограничителя частоты и метрик
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Номер текущего входа: позволяет не перелогиниваться повторно, если это уже сделал другой поток
+        self._auth_generation = 0
+        self._auth_lock = threading.Lock()
+
+    def _send_once(self, method: str, url: str, **kwargs) -> requests.Response:
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+        started_at = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            if self.metrics:
+                self.metrics.observe_request(get_endpoint_name(url), time.perf_counter() - started_at, 0, None)
+            raise
+
+        if self.metrics:
+            self.metrics.observe_request(get_endpoint_name(url), time.perf_counter() - started_at,
+                                         len(response.content), response.status_code)
+        return response
+
+    def _get_retry_delay(self, attempt: int, response: requests.Response | None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_factor * 2 ** attempt + random.uniform(0, self.backoff_jitter)
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        attempts = self.retries + 1 if method == "GET" else 1
+        for attempt in range(attempts):
+            response = None
+            try:
+                response = self._send_once(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"{method} {url} failed: {err}, retrying")
+            else:
+                if response.status_code not in self.RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+                logger.warning(f"Got {response.status_code} for {url}, retrying")
+
+            time.sleep(self._get_retry_delay(attempt, response))
+
+    def request(self, method: str, url: str, retry_auth: bool = True, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+
+        auth_generation = self._auth_generation
+        response = self._send(method, url, **kwargs)
+
+        if response.status_code not in self.AUTH_ERROR_STATUSES or not retry_auth or not self.reauthenticate:
+            return response
+
+        with self._auth_lock:
+            if auth_generation == self._auth_generation:
+                logger.warning(f"Got {response.status_code} for {url}, logging in again")
+                self.reauthenticate()
+                self._auth_generation += 1
+
+        return self._send(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
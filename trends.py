@@ -0,0 +1,131 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from writers import create_report_writer
+
+logger = logging.getLogger(__name__)
+
+
+METRIC_TITLES = {
+    "students": "Учеников",
+    "total": "Всего",
+    "non_renewed": "Непродлившие",
+    "renewed": "Продлившие",
+    "total_price": "Сумма",
+    "trials": "Пробных занятий",
+    "purchased": "Купили абонемент",
+    "conversion": "Конверсия, %",
+    "group.ATTEND": "Групповые: посетил(а)",
+    "group.WORKED_OUT": "Групповые: отработал(а)",
+    "group.SKIP": "Групповые: пропустил(а)",
+    "group.ATTENDED_TRIAL": "Групповые: посетил(а) платное пробное",
+    "group.attendances_count": "Групповые: проведенных занятий",
+    "individual.ATTEND": "Индивидуальные: посетил(а)",
+    "individual.WORKED_OUT": "Индивидуальные: отработал(а)",
+    "individual.SKIP": "Индивидуальные: пропустил(а)",
+    "individual.ATTENDED_TRIAL": "Индивидуальные: посетил(а) платное пробное",
+    "individual.attendances_count": "Индивидуальные: проведенных занятий",
+    "lessons": "Занятий",
+    "attendees": "Учеников на занятиях",
+}
+
+
+class TrendStore:
+    """Хранилище итогов отчетов на SQLite для сравнения периодов.
+
+    После каждого отчета сохраняются его итоги за период отчета: {ключ: {показатель: значение}}, где ключ -
+    преподаватель, день недели или пустая строка для итогов по всем ученикам. Повторный запуск
+    отчета за тот же период заменяет итоги.
+    """
+
+    def __init__(self, path: str = "trends.sqlite3"):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            "report TEXT NOT NULL, period_start TEXT NOT NULL, period_end TEXT NOT NULL, position INTEGER NOT NULL, "
+            "key TEXT NOT NULL, metric TEXT NOT NULL, value REAL, recorded_at REAL NOT NULL, "
+            "PRIMARY KEY (report, period_start, period_end, key, metric))"
+        )
+        self._connection.commit()
+
+    def record(self, report: str, period: tuple[date, date | None], summary: dict) -> None:
+        """Сохраняет итоги отчета за период"""
+        period_start, period_end = period[0].isoformat(), period[1].isoformat() if period[1] else ""
+        now = time.time()
+        rows = [
+            (report, period_start, period_end, position, key, metric, value, now)
+            for position, (key, metric, value) in enumerate(
+                (key, metric, value) for key, metrics in summary.items() for metric, value in metrics.items()
+            )
+        ]
+
+        with self._lock:
+            self._connection.execute("DELETE FROM metrics WHERE report = ? AND period_start = ? AND period_end = ?",
+                                     (report, period_start, period_end))
+            self._connection.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._connection.commit()
+
+        logger.info(f"Trends recorded for {report} {period_start} - {period_end}: {len(rows)} values")
+
+    def get_reports(self) -> list:
+        with self._lock:
+            return [report for report, in self._connection.execute("SELECT DISTINCT report FROM metrics")]
+
+    def get_series(self, report: str, periods_count: int) -> tuple[list, dict]:
+        """Последние periods_count периодов отчета по возрастанию и значения:
+        ([(начало, конец), ...], {(ключ, показатель): {(начало, конец): значение}})"""
+        with self._lock:
+            periods = self._connection.execute(
+                "SELECT DISTINCT period_start, period_end FROM metrics WHERE report = ? "
+                "ORDER BY period_start DESC, period_end DESC LIMIT ?", (report, periods_count)
+            ).fetchall()
+            periods.reverse()
+            rows = self._connection.execute(
+                "SELECT period_start, period_end, key, metric, value FROM metrics WHERE report = ? "
+                "AND period_start >= ? ORDER BY period_start DESC, period_end DESC, position",
+                (report, periods[0][0] if periods else "")
+            ).fetchall()
+
+        # Ключи и показатели идут в порядке последнего периода, затем появившиеся только в прошлых периодах
+        series = dict()
+        for period_start, period_end, key, metric, value in rows:
+            if (period_start, period_end) in periods:
+                series.setdefault((key, metric), dict())[(period_start, period_end)] = value
+        return periods, series
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def _format_period(period: tuple[str, str]) -> str:
+    return f"{period[0]} - {period[1]}" if period[1] else f"с {period[0]}"
+
+
+def create_trends_report(store: TrendStore, filename: str, reports: list, periods_count: int = 6) -> None:
+    """Отчет по трендам: для каждого отчета значения показателей за последние периоды и изменение
+    последнего периода относительно предыдущего. Использует только сохраненные итоги"""
+    stored_reports = store.get_reports()
+    with create_report_writer(filename) as writer:
+        if not stored_reports:
+            writer.start_sheet(None, ["Нет сохраненных итогов отчетов"])
+
+        for report in [report for report in reports if report in stored_reports]:
+            periods, series = store.get_series(report, periods_count)
+            writer.start_sheet(report, ["Ключ", "Показатель", *map(_format_period, periods),
+                                        "Изменение", "Изменение, %"])
+            for (key, metric), values in series.items():
+                row_values = [values.get(period) for period in periods]
+                change, change_percent = None, None
+                if len(periods) > 1 and row_values[-1] is not None and row_values[-2] is not None:
+                    change = round(row_values[-1] - row_values[-2], 2)
+                    if row_values[-2]:
+                        change_percent = round(100 * change / row_values[-2], 1)
+                writer.write_row([key or "Всего", METRIC_TITLES.get(metric, metric), *row_values,
+                                  change, change_percent])
+
+    logger.info("Trends report was created")
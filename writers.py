@@ -0,0 +1,157 @@
+import csv
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Iterable
+
+import openpyxl
+
+logger = logging.getLogger(__name__)
+
+
+class ReportWriter(ABC):
+    """Потоковая запись отчета: строки пишутся по мере поступления и не накапливаются в памяти.
+
+    Отчет состоит из одного или нескольких листов, каждый лист начинается со строки заголовков.
+    В write_time накапливается время, потраченное на саму запись (без получения строк).
+    """
+
+    supports_formulas = False
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.rows_count = 0
+        self.write_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start_sheet(self, title: str | None, headers: list) -> None:
+        started_at = time.perf_counter()
+        self._start_sheet(title, headers)
+        self.write_time += time.perf_counter() - started_at
+
+    def write_row(self, row: list) -> None:
+        started_at = time.perf_counter()
+        self._write_row(row)
+        self.write_time += time.perf_counter() - started_at
+        self.rows_count += 1
+
+    def write_rows(self, rows: Iterable[list]) -> None:
+        for row in rows:
+            self.write_row(row)
+
+    def close(self) -> None:
+        started_at = time.perf_counter()
+        self._close()
+        self.write_time += time.perf_counter() - started_at
+        logger.info(f"Report {self.filename} written: {self.rows_count} rows")
+
+    @abstractmethod
+    def _start_sheet(self, title: str | None, headers: list) -> None:
+        pass
+
+    @abstractmethod
+    def _write_row(self, row: list) -> None:
+        pass
+
+    @abstractmethod
+    def _close(self) -> None:
+        pass
+
+
+class XlsxReportWriter(ReportWriter):
+    """XLSX в режиме openpyxl write-only: строки сразу сбрасываются во временный файл"""
+
+    supports_formulas = True
+
+    def __init__(self, filename: str):
+        super().__init__(filename)
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._sheet = None
+
+    def _start_sheet(self, title: str | None, headers: list) -> None:
+        # Excel не открывает книги с названием листа длиннее 31 символа
+        self._sheet = self._workbook.create_sheet(title[:31] if title else title)
+        self._sheet.append(headers)
+
+    def _write_row(self, row: list) -> None:
+        self._sheet.append(row)
+
+    def _close(self) -> None:
+        self._workbook.save(self.filename)
+
+
+class CsvReportWriter(ReportWriter):
+    """CSV в UTF-8 с BOM, чтобы Excel правильно открывал кириллицу. Листы разделяются пустой строкой"""
+
+    def __init__(self, filename: str):
+        super().__init__(filename)
+        self._file = open(filename, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._file)
+        self._sheets_count = 0
+
+    def _start_sheet(self, title: str | None, headers: list) -> None:
+        if self._sheets_count:
+            self._writer.writerow([])
+        if title:
+            self._writer.writerow([title])
+        self._writer.writerow(headers)
+        self._sheets_count += 1
+
+    def _write_row(self, row: list) -> None:
+        self._writer.writerow(row)
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class JsonLinesReportWriter(ReportWriter):
+    """JSON Lines: по объекту на строку, ключи - заголовки столбцов, для нескольких листов добавляется sheet"""
+
+    def __init__(self, filename: str):
+        super().__init__(filename)
+        self._file = open(filename, "w", encoding="utf-8")
+        self._title = None
+        self._keys = []
+
+    def _start_sheet(self, title: str | None, headers: list) -> None:
+        self._title = title
+
+        # Одинаковые заголовки столбцов получают номер, чтобы значения не перезаписывали друг друга
+        self._keys = []
+        for header in headers:
+            key, number = header, 1
+            while key in self._keys:
+                number += 1
+                key = f"{header} ({number})"
+            self._keys.append(key)
+
+    def _write_row(self, row: list) -> None:
+        record = dict(zip(self._keys, row))
+        if self._title:
+            record = {"sheet": self._title, **record}
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+REPORT_WRITERS = {
+    ".xlsx": XlsxReportWriter,
+    ".csv": CsvReportWriter,
+    ".jsonl": JsonLinesReportWriter,
+}
+
+
+def create_report_writer(filename: str) -> ReportWriter:
+    """Создает писателя отчета по расширению файла"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in REPORT_WRITERS:
+        raise ValueError(f"Неподдерживаемый формат отчета: {extension}")
+    return REPORT_WRITERS[extension](filename)